@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+
+from persist import atomic_write_json, file_lock
+from questions import DIFFICULTIES, normalize_difficulty, question_key
+
+log = logging.getLogger(__name__)
+
+# per-question counters, in snapshot order
+FIELDS = ("attempts", "correct", "timeouts", "fifty", "call", "answered", "answer_seconds", "answer_seconds_sq")
+_ATTEMPTS, _CORRECT, _TIMEOUTS, _FIFTY, _CALL, _ANSWERED, _SECONDS, _SECONDS_SQ = range(len(FIELDS))
+
+# smoothed correct rate at or above which a question counts as that level
+EMPIRICAL_LEVELS = ((0.85, "easy"), (0.65, "medium"), (0.40, "hard"), (0.0, "expert"))
+
+
+class AnswerStats:
+    """Streaming per-question answer statistics, keyed by `Question.key`.
+
+    Theme files reuse ids, so rows are keyed by theme and position in the
+    file; the id is kept alongside for the report.
+
+    Each `record_*` call is a few integer adds under a lock. Counts are kept
+    as deltas since the last snapshot; a background thread adds them into
+    the table at `path` (under an flock, temp file + os.replace) every
+    `snapshot_interval` seconds when something changed, and once more at
+    exit. So the file keeps accumulating across restarts, and worker
+    processes sharing it each add their own counts.
+
+    A timeout and a wrong answer are both attempts that were not correct.
+    Time-to-answer covers submitted answers only.
+    """
+
+    def __init__(self, path, snapshot_interval=60.0):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.Lock()
+        self._rows = {}    # key -> [counters in FIELDS order], since the last snapshot
+        self._labels = {}  # key -> (theme, qid, labelled difficulty)
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="answer-stats", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _row(self, q):
+        key = q.key
+        row = self._rows.get(key)
+        if row is None:
+            row = self._rows[key] = [0] * len(FIELDS)
+            self._labels[key] = (q.theme, q.qid, q.difficulty)
+        return row
+
+    # ---- recording (request path) ----
+
+    def record_answer(self, q, correct, seconds):
+        if self._thread is None:
+            self._start()
+        with self._lock:
+            row = self._row(q)
+            row[_ATTEMPTS] += 1
+            row[_CORRECT] += bool(correct)
+            row[_ANSWERED] += 1
+            row[_SECONDS] += seconds
+            row[_SECONDS_SQ] += seconds * seconds
+
+    def record_timeout(self, q):
+        if self._thread is None:
+            self._start()
+        with self._lock:
+            row = self._row(q)
+            row[_ATTEMPTS] += 1
+            row[_TIMEOUTS] += 1
+
+    def record_lifeline(self, q, kind):
+        """`kind` is "fifty" or "call"."""
+        if self._thread is None:
+            self._start()
+        with self._lock:
+            self._row(q)[_FIFTY if kind == "fifty" else _CALL] += 1
+
+    # ---- snapshots ----
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.snapshot_interval)
+            try:
+                self.flush()
+            except Exception:  # keep counting; the next snapshot retries
+                log.exception("answer stats snapshot failed")
+
+    def _merge(self, rows, labels):
+        with self._lock:
+            for key, delta in rows.items():
+                row = self._rows.get(key)
+                if row is None:
+                    self._rows[key] = delta
+                    self._labels[key] = labels[key]
+                else:
+                    for i, n in enumerate(delta):
+                        row[i] += n
+
+    def flush(self):
+        with self._lock:
+            rows, labels = self._rows, self._labels
+            self._rows, self._labels = {}, {}
+        if not rows:
+            return
+        try:
+            with file_lock(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        questions = json.load(f).get("questions", {})
+                except (FileNotFoundError, ValueError):
+                    questions = {}
+                for key, delta in rows.items():
+                    s = questions.setdefault(key, {name: 0 for name in FIELDS})
+                    s["theme"], s["qid"], s["difficulty"] = labels[key]
+                    for name, n in zip(FIELDS, delta):
+                        s[name] = s.get(name, 0) + n
+                atomic_write_json(self.path, {"updated": time.time(), "questions": questions})
+        except BaseException:
+            self._merge(rows, labels)  # keep them for the next snapshot
+            raise
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+
+# ----------------- Offline report -----------------
+
+def empirical_level(correct, attempts):
+    rate = (correct + 1) / (attempts + 2)  # Laplace-smoothed
+    for threshold, level in EMPIRICAL_LEVELS:
+        if rate >= threshold:
+            return rate, level
+
+
+def labels_from_files(theme_files):
+    """{key: (theme, qid, difficulty)} from {theme: path}, keyed like `Question.key`."""
+    labels = {}
+    for theme, path in theme_files.items():
+        with open(path, "r", encoding="utf-8") as f:
+            for pos, record in enumerate(json.load(f)):
+                labels[question_key(theme, pos)] = (theme, record.get("id", ""), normalize_difficulty(record))
+    return labels
+
+
+def report(questions, labels=None, min_attempts=20, worst=10):
+    """Labelled vs empirical difficulty per theme, as plain text."""
+    if labels is None:
+        labels = {key: (s["theme"], s.get("qid", key), s["difficulty"]) for key, s in questions.items()}
+    themes = {}
+    for key, (theme, qid, label) in labels.items():
+        themes.setdefault(theme, []).append((key, qid, label))
+
+    lines = []
+    for theme in sorted(themes):
+        rows = themes[theme]
+        scored = []
+        for key, qid, label in rows:
+            s = questions.get(key)
+            if s and s["attempts"] >= min_attempts:
+                rate, level = empirical_level(s["correct"], s["attempts"])
+                scored.append((f"{qid} ({key})", label, level, rate, s))
+        lines.append(f"## {theme}: {len(scored)}/{len(rows)} questions with >= {min_attempts} attempts")
+        if not scored:
+            lines.append("")
+            continue
+
+        agree = sum(label == level for _qid, label, level, _r, _s in scored)
+        lines.append(f"labels agree with play: {agree}/{len(scored)} ({100 * agree / len(scored):.0f}%)")
+        lines.append("")
+        lines.append("label \\ played  " + "".join(f"{d:>8s}" for d in DIFFICULTIES) + "   correct  lifeline  avg s")
+        for label in DIFFICULTIES:
+            group = [x for x in scored if x[1] == label]
+            if not group:
+                continue
+            counts = "".join(f"{sum(x[2] == d for x in group):8d}" for d in DIFFICULTIES)
+            attempts = sum(x[4]["attempts"] for x in group)
+            correct = sum(x[4]["correct"] for x in group)
+            lifelines = sum(x[4]["fifty"] + x[4]["call"] for x in group)
+            answered = sum(x[4]["answered"] for x in group)
+            seconds = sum(x[4]["answer_seconds"] for x in group)
+            lines.append(f"{label:15s} {counts}   {100 * correct / attempts:6.1f}%  "
+                         f"{100 * lifelines / attempts:7.1f}%  {seconds / answered if answered else 0:5.1f}")
+        lines.append("")
+
+        off = sorted(scored, key=lambda x: (-abs(DIFFICULTIES.index(x[1]) - DIFFICULTIES.index(x[2])),
+                                            -x[4]["attempts"]))
+        off = [x for x in off if x[1] != x[2]][:worst]
+        if off:
+            lines.append("most mislabelled:")
+            for name, label, level, rate, s in off:
+                lines.append(f"  {name:40s} labelled {label:6s} plays {level:6s} "
+                             f"({100 * rate:.0f}% correct over {s['attempts']})")
+            lines.append("")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python analytics.py /mnt/persistent/analytics.json [Friends=FRIENDS.txt "The Office=Office.txt" ...]
+    from engine import THEME_FILES
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python analytics.py <analytics.json> [theme=file ...]")
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        stats = json.load(f)["questions"]
+    # rows are keyed by the live theme name, so a bare path must be one of
+    # the app's own theme files; with none given, label from all of them
+    by_file = {os.path.basename(path): theme for theme, path in THEME_FILES.items()}
+    files = {}
+    for arg in sys.argv[2:]:
+        if "=" in arg:
+            theme, path = arg.split("=", 1)
+        elif os.path.basename(arg) in by_file:
+            theme, path = by_file[os.path.basename(arg)], arg
+        else:
+            sys.exit(f"{arg}: not a theme file of the app; pass it as theme=file")
+        files[theme] = path
+    print(report(stats, labels_from_files(files or THEME_FILES)))
@@ -0,0 +1,122 @@
+"""Cold start of N workers: separate `python Theme.py` processes vs forks of a preloaded parent.
+
+    python benchmarks/bench_coldstart.py [--workers 2]
+
+"spawn" starts N fresh interpreters, each importing Gradio and opening the
+bank on its own. "fork" is what workers.py does: the parent imports the
+app and preloads the bank once, then forks N workers that share both
+copy-on-write. For each case: time until every worker answers GET /,
+latency of the first game start (theme -> mixed) on worker 1, and the
+workers' total PSS (shared pages split between the processes using them).
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+os.environ.setdefault("GRADIO_ANALYTICS_ENABLED", "False")
+
+from gradio_client import Client  # noqa: E402
+
+import engine  # noqa: E402
+import workers  # noqa: E402
+from loadgen import endpoints, THEME  # noqa: E402
+
+
+def free_ports(n):
+    socks = [socket.socket() for _ in range(n)]
+    for s in socks:
+        s.bind(("127.0.0.1", 0))
+    ports = [s.getsockname()[1] for s in socks]
+    for s in socks:
+        s.close()
+    return ports
+
+
+def wait_ready(urls, timeout=120):
+    start = time.monotonic()
+    for url in urls:
+        while True:
+            try:
+                urllib.request.urlopen(url + "/", timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() - start > timeout:
+                    sys.exit(f"{url} did not come up in {timeout}s")
+                time.sleep(0.05)
+
+
+def pss_mb(pid):
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def first_game_ms(url, eps):
+    client = Client(url, verbose=False)
+    t0 = time.perf_counter()
+    for name, args in (("theme", ()), ("mixed", (THEME,))):
+        for i, api_name in enumerate(eps[name]):
+            client.predict(*(args if i == 0 else ()), api_name=api_name)
+    elapsed = time.perf_counter() - t0
+    client.close()
+    return elapsed * 1e3
+
+
+def spawn(n, persistent_dir):
+    ports = free_ports(n)
+    t0 = time.monotonic()
+    procs = [subprocess.Popen([sys.executable, "Theme.py"], cwd=ROOT, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL,
+                              env=dict(os.environ, PERSISTENT_DIR=persistent_dir,
+                                       SERVER_NAME="127.0.0.1", PORT=str(port)))
+             for port in ports]
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    wait_ready(urls)
+    return time.monotonic() - t0, [p.pid for p in procs], urls
+
+
+def fork(n, persistent_dir):
+    # the ports are consecutive after a base, as workers.py lays them out
+    base = free_ports(1)[0]
+    config = engine.Config.from_env(persistent_dir=persistent_dir, preload=True)
+    t0 = time.monotonic()
+    pids, urls = workers.start_workers(config, n, base)
+    return time.monotonic() - t0, pids, urls
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=2)
+    args = ap.parse_args()
+    eps = endpoints()
+
+    print(f"{args.workers} workers\n")
+    print(f"{'':6s} {'all ready':>10s} {'first game':>11s} {'total PSS':>10s}")
+    for name, start in (("fork", fork), ("spawn", spawn)):  # fork before any client threads exist
+        tmp = tempfile.mkdtemp(prefix=f"quiz-cold-{name}-")
+        ready, pids, urls = start(args.workers, tmp)
+        try:
+            game = first_game_ms(urls[0], eps)
+            pss = sum(pss_mb(pid) for pid in pids)
+        finally:
+            for pid in pids:
+                os.kill(pid, signal.SIGTERM)
+            for pid in pids:
+                os.waitpid(pid, 0)
+        print(f"{name:6s} {ready:9.2f}s {game:9.0f}ms {pss:8.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
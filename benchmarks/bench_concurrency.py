@@ -0,0 +1,56 @@
+"""Throughput under concurrent load: one request per event vs the configured pools.
+
+    python benchmarks/bench_concurrency.py [--players 40] [--duration 30]
+
+Runs benchmarks/loadgen.py twice with the same seed. "serial" sets
+FAST_CONCURRENCY=1 and PERSIST_CONCURRENCY=1, which is Gradio's default of
+one request per event at a time. "pooled" uses the defaults from engine.Config.
+Think time is short, so the players keep the server busy.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOADGEN = os.path.join(ROOT, "benchmarks", "loadgen.py")
+
+CONFIGS = {
+    "serial": {"FAST_CONCURRENCY": "1", "PERSIST_CONCURRENCY": "1"},
+    "pooled": {},
+}
+
+
+def run(name, env_overrides, args):
+    out = os.path.join(tempfile.mkdtemp(prefix="quiz-conc-"), f"{name}.json")
+    env = dict(os.environ, **env_overrides)
+    for key in ("FAST_CONCURRENCY", "PERSIST_CONCURRENCY"):
+        if key not in env_overrides:
+            env.pop(key, None)
+    subprocess.run([sys.executable, LOADGEN, "--players", str(args.players), "--duration", str(args.duration),
+                    "--think-min", "0.05", "--think-max", "0.2", "--seed", "7", "--out", out],
+                   env=env, check=True, stderr=subprocess.DEVNULL)
+    with open(out) as f:
+        return json.load(f)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--players", type=int, default=40)
+    ap.add_argument("--duration", type=float, default=30.0)
+    args = ap.parse_args()
+
+    results = {name: run(name, env, args) for name, env in CONFIGS.items()}
+    print(f"{args.players} players, {args.duration:.0f}s each\n")
+    print(f"{'':8s} {'events/s':>9s} {'errors':>7s} {'submit p50':>11s} {'submit p99':>11s} {'next p50':>9s} {'next p99':>9s}")
+    for name, r in results.items():
+        sub, nxt = r["events"].get("submit", {}), r["events"].get("next", {})
+        print(f"{name:8s} {r['events_per_s']:9.1f} {r['errors']:7d} "
+              f"{sub.get('p50_ms') or 0:9.0f}ms {sub.get('p99_ms') or 0:9.0f}ms "
+              f"{nxt.get('p50_ms') or 0:7.0f}ms {nxt.get('p99_ms') or 0:7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Memory left behind by abandoned games, and what the session reaper gets back.
+
+    python benchmarks/bench_idle_sessions.py [--games 30]
+
+Runs the app in this process (uvicorn on a thread, tracemalloc on) with a
+short idle TTL, then plays --games games over the raw queue API (see
+bench_payload.py) that stop mid-run, the way a closed PWA does: no Play
+Again, no unload. Reports Python heap per game while the sessions are
+live, then again once they have idled out and the reaper has swept twice
+(finished queue events go on the second sweep). Sweeps are run by hand
+here, so the first number is what a server without the reaper keeps for
+good.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import gc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+os.environ.setdefault("GRADIO_ANALYTICS_ENABLED", "False")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+import Theme  # noqa: E402
+import engine  # noqa: E402
+from bench_payload import App, Player, THEME_FILE, question  # noqa: E402
+
+IDLE_SECONDS = 2.0
+
+
+def abandon(app, http, rng, answers):
+    """Start a mixed run, answer a few questions, walk away."""
+    p = Player(app, http)
+    radio = next(i for i, c in app.components.items() if c["type"] == "radio")
+
+    def fire(name):
+        chain = app.event(name)
+        p.fire(chain, chain[0]["targets"][0][0], [])
+
+    fire("mixed")
+    qtext = next(i for i in app.event("mixed")[-1]["outputs"]
+                 if app.components[i]["type"] == "markdown" and question(p.values.get(i)))
+    for _ in range(rng.randint(1, 6)):
+        p.values[radio] = answers[question(p.values[qtext])]
+        fire("submit")
+        fire("next")
+
+
+async def prune_queue(reaper):
+    return reaper.prune_queue()
+
+
+def reap(reaper, loop):
+    """Two sweeps, as the server runs them: sessions from any thread, the queue on its loop."""
+    time.sleep(IDLE_SECONDS)
+    for _ in range(2):
+        reaper.sweep()
+        asyncio.run_coroutine_threadsafe(prune_queue(reaper), loop).result()
+
+
+def heap():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--games", type=int, default=30)
+    args = ap.parse_args()
+
+    config = engine.Config.from_env(persistent_dir=tempfile.mkdtemp(prefix="quiz-idle-"),
+                                    session_idle_seconds=IDLE_SECONDS)
+    built = []
+    build_demo = Theme.build_demo
+    Theme.build_demo = lambda c: built.append(build_demo(c)) or built[-1]
+    asgi = Theme.create_app(config)
+    reaper = built[0].reaper
+    reaper.interval = 3600  # no background sweeps: see reap()
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(asgi, host="127.0.0.1", port=port, log_level="warning"))
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_until_complete, args=(server.serve(),), daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    with open(THEME_FILE, encoding="utf-8") as f:
+        answers = {r["question"]: r["answer"] for r in json.load(f)}
+    app = App(f"http://127.0.0.1:{port}")
+    rng = random.Random(1)
+    try:
+        with httpx.Client(timeout=30) as http:
+            abandon(app, http, rng, answers)  # warm up imports and caches
+            reap(reaper, loop)
+            tracemalloc.start()
+            base = heap()
+            for _ in range(args.games):
+                abandon(app, http, rng, answers)
+            live = heap() - base
+            held = len(reaper.holder.session_data), len(reaper.queue.event_ids_to_events)
+            reap(reaper, loop)
+            reaped = heap() - base
+    finally:
+        server.should_exit = True
+
+    print(f"{args.games} abandoned games")
+    print(f"live     {live / args.games / 1024:8.1f} KB/game   ({held[0]} sessions, {held[1]} queue events)")
+    print(f"reaped   {reaped / args.games / 1024:8.1f} KB/game   ({len(reaper.holder.session_data)} sessions, "
+          f"{len(reaper.queue.event_ids_to_events)} queue events; evicted {reaper.evicted}, "
+          f"{reaper.events_dropped} events dropped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Leaderboard page-view cost at 1M stored entries, before/after the top-K cache.
+
+    python benchmarks/bench_leaderboard.py [--entries 1000000] [--iters 5]
+
+"before" is a store read plus a fresh render on every view (what
+get_leaderboard did); "after" is the memoized per-theme Markdown. Also times
+a save that enters the top K (store write excluded) and one that does not.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from leaderboard import JsonLeaderboard, CachedLeaderboard  # noqa: E402
+
+THEMES = ["Friends", "Naruto", "Avengers", "The Office", "The Big Bang Theory"]
+
+
+def render(entries):
+    rows = [f"**{i}. {nick}** — {pts} pts\n\n" for i, (nick, pts) in enumerate(entries, start=1)]
+    return "## 🏆 Leaderboard\n\n" + "".join(rows)
+
+
+class NullStore:
+    """Accepts every write instantly so only the in-memory update is timed."""
+
+    def __init__(self, board):
+        self.board = board
+
+    def submit(self, theme, nick, pin, score):
+        return True
+
+    def top_players(self, theme, n=20):
+        return self.board[:n]
+
+    def version(self):
+        return 0
+
+    def wrote(self, since, now):
+        return True
+
+
+def timed(fn, iters):
+    samples = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=1_000_000)
+    ap.add_argument("--iters", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    path = os.path.join(tempfile.mkdtemp(prefix="lb-bench-"), "leaderboard.json")
+    data = {
+        f"{rng.choice(THEMES)}|player{i}|{rng.randrange(10000):04d}": rng.randrange(1, 500)
+        for i in range(args.entries)
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    store = JsonLeaderboard(path)
+    before = timed(lambda: render(store.top("Friends", 20)), args.iters)
+
+    cached = CachedLeaderboard(store, k=20, render=render)
+    cached.markdown("Friends")  # first view loads the board once
+    after = timed(lambda: cached.markdown("Friends"), 10_000)
+
+    mem = CachedLeaderboard(NullStore(store.top_players("Friends", 20)), k=20, render=render)
+    mem.markdown("Friends")
+    enters = timed(lambda: mem.submit("Friends", "newbie", "0000", 10_000), 10_000)
+    misses = timed(lambda: mem.submit("Friends", "meh", "0000", 1), 10_000)
+
+    print(f"{args.entries} stored entries, {os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"page view before   {before:10.3f} ms")
+    print(f"page view after    {after:10.6f} ms")
+    print(f"save, enters top K {enters:10.6f} ms (in-memory part)")
+    print(f"save, misses top K {misses:10.6f} ms (in-memory part)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Bytes on the wire per quiz event, measured against a running app.
+
+    python benchmarks/bench_payload.py [--games 5] [--app-dir DIR | --url URL]
+
+Launches `python Theme.py` from --app-dir (default: this checkout; point it
+at a `git worktree` of an older commit for a before/after) and plays
+--games seeded games over the raw queue API, the way the browser does:
+every input component's current value goes up with /queue/join (gr.State
+inputs as null) and the process_completed message comes back over the
+SSE stream. Events are found in /config by the label of the button that
+fires them, so any version of the UI can be measured. .then() chains are
+followed and counted as one event; browser-only steps send nothing.
+
+Prints request / response bytes per event type (mean per click) and per
+game.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from collections import defaultdict
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THEME, THEME_FILE = "Friends", "FRIENDS.txt"
+
+# event name -> label of the button that fires it (the timer is found by type)
+BUTTONS = {
+    "mixed": "🔀 Mixed",
+    "submit": "Submit",
+    "next": "Next Question",
+    "fifty": "🎲 50:50",
+    "call": "📞 Call a Friend",
+    "restart": "Play Again",
+}
+
+
+def launch(app_dir, timeout=120):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    tmp = tempfile.mkdtemp(prefix="quiz-payload-")
+    env = dict(os.environ, PERSISTENT_DIR=tmp, SERVER_NAME="127.0.0.1", PORT=str(port),
+               GRADIO_ANALYTICS_ENABLED="False")
+    proc = subprocess.Popen([sys.executable, "Theme.py"], cwd=app_dir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if proc.poll() is not None:
+            sys.exit(f"server exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(url + "/", timeout=1).close()
+            return proc, url
+        except OSError:
+            time.sleep(0.25)
+    proc.kill()
+    sys.exit(f"server did not come up in {timeout}s")
+
+
+class App:
+    """The /config of a running app: components, and event chains by trigger."""
+
+    def __init__(self, url):
+        self.url = url
+        with urllib.request.urlopen(url + "/config") as r:
+            config = json.load(r)
+        self.prefix = url + config.get("api_prefix", "")
+        self.components = {c["id"]: c for c in config["components"]}
+        deps = config["dependencies"]
+        after = defaultdict(list)
+        for d in deps:
+            if d["trigger_after"] is not None:
+                after[d["trigger_after"]].append(d)
+        self.chains = {}
+        for d in deps:
+            for block_id, event in d["targets"]:
+                if block_id is None:
+                    continue
+                chain, todo = [], [d]
+                while todo:
+                    g = todo.pop(0)
+                    chain.append(g)
+                    todo.extend(after.get(g["id"], ()))
+                self.chains.setdefault((block_id, event), []).append(chain)
+
+    def label(self, block_id):
+        return self.components[block_id].get("props", {}).get("value")
+
+    def event(self, name):
+        if name == "tick":
+            return next(c for (b, e), cs in self.chains.items() for c in cs
+                        if e == "tick" and self.components[b]["type"] == "timer")
+        found = [c for (b, e), cs in self.chains.items() for c in cs
+                 if e == "click" and self.label(b) == BUTTONS[name]]
+        # two "Submit" buttons: the quiz one takes more inputs than the feedback form
+        return max(found, key=lambda c: sum(len(d["inputs"]) for d in c))
+
+    def theme_textbox(self):
+        chain = next(cs[0] for (b, e), cs in self.chains.items()
+                     if e == "click" and self.label(b) == THEME)
+        return chain[0]["outputs"][0]
+
+
+class Player:
+    def __init__(self, app, http):
+        self.app = app
+        self.http = http
+        self.session = "".join(random.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(11))
+        self.values = {i: c.get("props", {}).get("value") for i, c in app.components.items()}
+        self.values[app.theme_textbox()] = THEME  # set in the browser by the theme button
+        self.choices = {}
+
+    def fire(self, chain, trigger_id, sizes):
+        sent = received = 0
+        for d in chain:
+            if not d["backend_fn"]:
+                continue
+            data = [None if self.app.components[i]["type"] == "state" else self.values.get(i)
+                    for i in d["inputs"]]
+            body = json.dumps({"data": data, "event_data": None, "fn_index": d["id"],
+                               "trigger_id": trigger_id, "session_hash": self.session})
+            sent += len(body.encode())
+            r = self.http.post(self.app.prefix + "/queue/join", content=body,
+                               headers={"Content-Type": "application/json"})
+            r.raise_for_status()
+            event_id = r.json()["event_id"]
+            with self.http.stream("GET", self.app.prefix + "/queue/data",
+                                  params={"session_hash": self.session}) as stream:
+                for line in stream.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    msg = json.loads(line[5:])
+                    if msg.get("event_id") != event_id or msg.get("msg") != "process_completed":
+                        continue
+                    received += len(line[5:].strip().encode())
+                    if not msg.get("success"):
+                        raise RuntimeError(msg)
+                    for i, v in zip(d["outputs"], msg["output"]["data"]):
+                        if isinstance(v, dict) and v.get("__type__") == "update":
+                            if "value" in v:
+                                self.values[i] = v["value"]
+                            if "choices" in v:
+                                self.choices[i] = [c[1] if isinstance(c, list) else c for c in v["choices"]]
+                        elif v is not None:
+                            self.values[i] = v
+                    break
+        sizes.append((sent, received))
+
+
+def question(md):
+    return md.split(": ", 1)[1] if isinstance(md, str) and ": " in md else None
+
+
+def play(app, http, rng, answers, stats):
+    p = Player(app, http)
+    ev = {name: app.event(name) for name in (*BUTTONS, "tick")}
+    trigger = {name: ev[name][0]["targets"][0][0] for name in ev}
+    radio = next(i for i, c in app.components.items() if c["type"] == "radio")
+
+    def fire(name):
+        p.fire(ev[name], trigger[name], stats[name])
+
+    fire("mixed")
+    qtext_id = next(i for i in ev["mixed"][-1]["outputs"]
+                    if app.components[i]["type"] == "markdown" and question(p.values.get(i)))
+    for n in range(rng.randint(3, 8)):
+        if n == 1:
+            fire("fifty")
+        if n == 2:
+            fire("call")
+        fire("tick")
+        correct = answers[question(p.values[qtext_id])]
+        wrong = next(c for c in p.choices[radio] if c != correct)
+        p.values[radio] = correct if n < 7 and rng.random() < 0.9 else wrong
+        fire("submit")
+        if p.values[radio] != correct:
+            break
+        fire("next")
+    fire("restart")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--games", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--app-dir", default=ROOT)
+    ap.add_argument("--url", help="measure an already running app")
+    args = ap.parse_args()
+
+    with open(os.path.join(ROOT, THEME_FILE), encoding="utf-8") as f:
+        answers = {r["question"]: r["answer"] for r in json.load(f)}
+    proc = None
+    url = args.url.rstrip("/") if args.url else None
+    if url is None:
+        proc, url = launch(args.app_dir)
+    stats = defaultdict(list)
+    try:
+        app = App(url)
+        rng = random.Random(args.seed)
+        with httpx.Client(timeout=30) as http:
+            for _ in range(args.games):
+                play(app, http, rng, answers, stats)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(30)
+
+    print(f"{'event':8s} {'clicks':>6s} {'sent B':>8s} {'recv B':>8s}")
+    total_sent = total_recv = 0
+    for name in ("mixed", "tick", "fifty", "call", "submit", "next", "restart"):
+        sizes = stats[name]
+        sent, recv = sum(s for s, _ in sizes), sum(r for _, r in sizes)
+        total_sent, total_recv = total_sent + sent, total_recv + recv
+        print(f"{name:8s} {len(sizes):6d} {sent / len(sizes):8.0f} {recv / len(sizes):8.0f}")
+    print(f"{'per game':15s} {total_sent / args.games:8.0f} {total_recv / args.games:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""get_randomized_run timing on a synthetic 100k-question theme.
+
+    python benchmarks/bench_sampler.py [--questions 100000] [--iters 200]
+
+Times the three modes as wired to the Easy/Hard/Mixed buttons, and the old
+pop/remove sampler at the same run length for comparison.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import engine  # noqa: E402
+from questions import QuestionBank, QuestionPack, compile_pack, DIFFICULTIES  # noqa: E402
+
+
+def synthetic_bank(n):
+    rng = random.Random(0)
+    records = [{
+        "question": f"q{i}", "options": ["a", "b", "c", "d"], "answer": "a",
+        "difficulty": rng.choice(DIFFICULTIES), "id": f"synthetic-{i}",
+    } for i in range(n)]
+    data = compile_pack("Synthetic", records)
+    bank = QuestionBank()
+    bank.add_theme("Synthetic", QuestionPack(data).count, lambda: data)
+    return bank
+
+
+def legacy_run(bank, theme, n):
+    """The pre-rewrite mixed sampler (pop at random index, list.remove)."""
+    buckets = {d: list(bank.difficulty_ids(theme, d)) for d in DIFFICULTIES}
+    order = list(DIFFICULTIES)
+
+    def pop_with_fallback(diff):
+        for i in range(order.index(diff), -1, -1):
+            if buckets[order[i]]:
+                b = buckets[order[i]]
+                return b.pop(random.randrange(len(b)))
+        return None
+
+    run = []
+    for _ in range(n // 10):
+        block = [q for q in (pop_with_fallback(d) for d in order) if q is not None]
+        remaining = [(d, q) for d, bl in buckets.items() for q in bl]
+        for _ in range(10 - len(block)):
+            d, q = remaining.pop(random.randrange(len(remaining)))
+            buckets[d].remove(q)
+            block.append(q)
+        random.shuffle(block)
+        run.extend(block)
+    return run
+
+
+def timed(fn, iters):
+    samples = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--questions", type=int, default=100_000)
+    ap.add_argument("--iters", type=int, default=200)
+    args = ap.parse_args()
+
+    engine.question_bank = bank = synthetic_bank(args.questions)
+    engine.get_randomized_run(theme="Synthetic")  # build buckets once
+
+    print(f"pool of {args.questions} questions, run of {engine.MAX_RUN_QUESTIONS}")
+    for label, kwargs in (("easy", {"difficulties": ["easy", "medium"]}),
+                          ("hard", {"difficulties": ["hard", "expert"]}),
+                          ("mixed", {})):
+        ms = timed(lambda: engine.get_randomized_run(theme="Synthetic", **kwargs), args.iters)
+        print(f"{label:6s} {ms:9.3f} ms")
+    ms = timed(lambda: legacy_run(bank, "Synthetic", engine.MAX_RUN_QUESTIONS), 3)
+    print(f"legacy mixed {ms:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
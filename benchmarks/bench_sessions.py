@@ -0,0 +1,66 @@
+"""Memory held by per-session runs at 5k sessions: list of dicts vs array of ids.
+
+    python benchmarks/bench_sessions.py [--sessions 5000]
+
+"before" keeps what the old get_randomized_run returned, a list of
+references into per-theme lists of dicts. "after" keeps the array of global
+ids that get_randomized_run returns now. The shared question table is
+measured separately, because it is paid for once per process.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import engine  # noqa: E402
+from questions import QuestionBank  # noqa: E402
+
+
+def measure(build):
+    tracemalloc.start()
+    held = build()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, size
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=5000)
+    args = ap.parse_args()
+    engine.question_bank = engine.open_bank(engine.Config())
+    themes = list(engine.THEME_FILES)
+
+    dict_bank, dict_table = measure(lambda: {
+        t: json.load(open(p, "r", encoding="utf-8")) for t, p in engine.THEME_FILES.items()
+    })
+    _, slots_table = measure(lambda: QuestionBank.from_files(engine.THEME_FILES))
+
+    def before():
+        runs = []
+        for i in range(args.sessions):
+            run = dict_bank[themes[i % len(themes)]].copy()
+            random.shuffle(run)
+            runs.append(run)
+        return runs
+
+    def after():
+        return [engine.get_randomized_run(theme=themes[i % len(themes)]) for i in range(args.sessions)]
+
+    _, before_runs = measure(before)
+    _, after_runs = measure(after)
+
+    print(f"{args.sessions} sessions")
+    print(f"shared table   dicts {dict_table / 1e6:8.2f} MB   slots  {slots_table / 1e6:8.2f} MB")
+    print(f"session runs   lists {before_runs / 1e6:8.2f} MB   arrays {after_runs / 1e6:8.2f} MB")
+    print(f"per session    lists {before_runs / args.sessions:8.0f} B    arrays {after_runs / args.sessions:8.0f} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Startup time and RSS with a large bank: eager JSON vs lazily mapped packs.
+
+    python benchmarks/bench_startup.py [--themes 50] [--questions 10000]
+
+Writes synthetic theme files, builds their packs (the build step), then in
+a fresh interpreter for each case measures time to a usable bank, RSS after
+startup, and the cost of the first selection of one theme.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from questions import build_pack, PACK_SUFFIX  # noqa: E402
+
+CHILD = r"""
+import sys, json, time
+sys.path.insert(0, ROOT)
+from questions import QuestionBank, DIFFICULTIES
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+files = json.loads(FILES)
+base = rss_mb()
+t0 = time.perf_counter()
+if MODE == "json":
+    bank = {t: json.load(open(p, encoding="utf-8")) for t, p in files.items()}
+else:
+    bank = QuestionBank.from_packs(files, PACK_DIR)
+startup = time.perf_counter() - t0
+after = rss_mb()
+
+theme = next(iter(files))
+t0 = time.perf_counter()
+if MODE == "json":
+    pool = [q for q in bank[theme] if q["difficulty"] in ("hard", "expert")]
+    first = pool[0]["question"]
+else:
+    pool = bank.difficulty_ids(theme, "hard") + bank.difficulty_ids(theme, "expert")
+    first = bank[pool[0]].text
+select = time.perf_counter() - t0
+print(json.dumps({"startup_s": startup, "rss_mb": after - base, "first_select_ms": select * 1e3}))
+"""
+
+
+def make_theme(path, theme, n, rng):
+    records = []
+    for i in range(n):
+        records.append({
+            "question": f"{theme} question {i}: " + " ".join(rng.choice(["who", "what", "when", "where", "why"]) for _ in range(12)),
+            "options": [f"option {j} for {i}" for j in range(4)],
+            "answer": f"option {rng.randrange(4)} for {i}",
+            "difficulty": rng.choice(["easy", "medium", "hard", "expert"]),
+            "score": 1,
+            "category": rng.choice(["Characters", "Plot", "Quotes", "Trivia"]),
+            "tags": rng.sample(["a", "b", "c", "d", "e", "f"], 2),
+            "timed": False,
+            "type": "multiple_choice",
+            "source": f"Season {rng.randrange(1, 10)}",
+            "explanation": "Because that is what happened in the episode.",
+            "id": f"{theme}-{i:05d}",
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f)
+
+
+def run_child(mode, files, pack_dir):
+    code = (CHILD.replace("ROOT", repr(ROOT)).replace("FILES", repr(json.dumps(files)))
+            .replace("MODE", repr(mode)).replace("PACK_DIR", repr(pack_dir)))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--themes", type=int, default=50)
+    ap.add_argument("--questions", type=int, default=10_000)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    tmp = tempfile.mkdtemp(prefix="bank-bench-")
+    pack_dir = os.path.join(tmp, "packs")
+    files = {}
+    for t in range(args.themes):
+        path = os.path.join(tmp, f"theme{t:02d}.txt")
+        make_theme(path, f"theme{t:02d}", args.questions, rng)
+        files[f"Theme {t:02d}"] = path
+        build_pack(f"Theme {t:02d}", path, os.path.join(pack_dir, f"theme{t:02d}{PACK_SUFFIX}"))
+
+    print(f"{args.themes} themes x {args.questions} questions")
+    for mode in ("json", "packs"):
+        r = run_child(mode, files, pack_dir)
+        print(f"{mode:6s} startup {r['startup_s']:7.3f} s   RSS +{r['rss_mb']:8.1f} MB   "
+              f"first selection {r['first_select_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Next Question latency with a large voucher file, before/after the voucher index.
+
+    python benchmarks/bench_vouchers.py [--codes 100000] [--iters 200]
+
+"before" replays the old per-click path (json.load of the whole file + dict
+checks) in front of Next Question (engine.advance + engine.lifelines);
+"after" is that path as shipped, which asks the in-memory VoucherLedger.
+"""
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import engine  # noqa: E402
+
+
+def make_voucher_file(path, n):
+    rng = random.Random(0)
+    alphabet = string.ascii_uppercase + string.digits
+    types = ["early", "unlimited", "disable", "fifty", "call"]
+    vouchers = {}
+    while len(vouchers) < n:
+        code = "".join(rng.choice(alphabet) for _ in range(8))
+        vouchers[code] = {"type": rng.choice(types), "redeemed": False, "consumed": False}
+    with open(path, "w") as f:
+        json.dump(vouchers, f, indent=2)
+    return vouchers
+
+
+def legacy_lookup(code):
+    with open(engine.config.voucher_file, "r") as f:
+        vouchers = json.load(f)
+    has_fifty = code and code in vouchers and vouchers[code]["type"] == "fifty" and not vouchers[code]["consumed"]
+    has_call = code and code in vouchers and vouchers[code]["type"] == "call" and not vouchers[code]["consumed"]
+    return has_fifty, has_call
+
+
+def timed(fn, iters):
+    samples = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples) * 1e3,
+        "p95_ms": samples[int(len(samples) * 0.95) - 1] * 1e3,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--codes", type=int, default=100_000)
+    ap.add_argument("--iters", type=int, default=200)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="vouchers-bench-")
+    path = os.path.join(tmp, "vouchers.json")
+    vouchers = make_voucher_file(path, args.codes)
+    code = next(c for c, v in vouchers.items() if v["type"] == "fifty")
+
+    engine.init(engine.Config(persistent_dir=tmp))
+    s = engine.GameSession()
+    engine.start(s, "Friends", "mixed", time.monotonic(), seed=1)
+    s.voucher, s.fifty_used, s.call_used = code, True, True
+
+    def call():
+        # Next Question with both lifelines used: the voucher decides the buttons
+        s.index, s.answered = 0, True
+        engine.advance(s, time.monotonic())
+        return engine.lifelines(s)
+
+    before = timed(lambda: (legacy_lookup(code), call()), args.iters)
+    engine.voucher_ledger.voucher_type(code)  # warm the ledger once
+    after = timed(call, args.iters)
+
+    print(f"voucher file: {args.codes} codes, {os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"before  median {before['median_ms']:8.3f} ms   p95 {before['p95_ms']:8.3f} ms")
+    print(f"after   median {after['median_ms']:8.3f} ms   p95 {after['p95_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Check that the installed Gradio still has the internals sessions.py reads.
+
+    python benchmarks/check_gradio_internals.py
+
+SessionReaper drops sessions from Gradio's StateHolder and prunes its
+queue's bookkeeping, neither of which is public API. This builds and
+mounts the app the way create_app does, then checks the pinned version,
+the attributes and their types, and that the reaper attached to both.
+Run it after changing the Gradio pin; exits non-zero on a mismatch.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+os.environ.setdefault("GRADIO_ANALYTICS_ENABLED", "False")
+
+import gradio as gr  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+import Theme  # noqa: E402
+import engine  # noqa: E402
+import sessions  # noqa: E402
+
+
+def main():
+    config = engine.Config(persistent_dir=tempfile.mkdtemp(prefix="quiz-gradio-"))
+    engine.init(config)
+    demo = Theme.build_demo(config)
+    gr.mount_gradio_app(FastAPI(), demo, path="")
+    demo.reaper.attach(demo)
+
+    holder_missing, queue_missing = sessions.missing_internals(demo)
+    holder, queue = demo.state_holder, demo._queue
+    checks = [
+        (f"gradio {gr.__version__} is the pinned {sessions.GRADIO_VERSION}",
+         gr.__version__ == sessions.GRADIO_VERSION),
+        ("state holder attributes", not holder_missing),
+        ("queue attributes", not queue_missing),
+        ("holder maps are dicts", not holder_missing
+         and isinstance(holder.session_data, dict) and isinstance(holder.time_last_used, dict)),
+        ("queue maps are dicts", not queue_missing
+         and isinstance(queue.event_ids_to_events, dict) and isinstance(queue.pending_event_ids_session, dict)),
+        ("reaper attached to the holder", demo.reaper.holder is holder),
+        ("reaper attached to the queue", demo.reaper.queue is queue),
+    ]
+    failures = 0
+    for name, ok in checks:
+        failures += not ok
+        print(f"{name:45s} {'OK' if ok else 'FAIL'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Hammer the shared stores from N processes at once and check the invariants.
+
+    python benchmarks/hammer_stores.py [--procs 8] [--codes 200] [--scores 200]
+
+Every process opens its own VoucherLedger on the same vouchers.json and,
+after a common start barrier, tries to consume every code. Each code must
+be consumed exactly once across all processes, and the ledger must say so
+afterwards (snapshot + journal, including compactions along the way).
+
+Every process then saves its own games to one ResumeStore, compacting
+every few KB along the way; each game must end with the last fields saved
+for it.
+
+Then every process submits its own players to one JSON leaderboard and one
+SQLite leaderboard; no score may be lost. Last, two CachedLeaderboards on
+the same store stand in for two workers: a score one submits must show up
+on the other's board, while the reader's own write-behind flushes must not
+make it read the store again. Exits non-zero on a violation.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing as mp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from vouchers import VoucherLedger  # noqa: E402
+from resume import ResumeStore  # noqa: E402
+from leaderboard import (  # noqa: E402
+    JsonLeaderboard, SqliteLeaderboard, WriteBehindLeaderboard, CachedLeaderboard,
+)
+
+
+def redeem_all(path, codes, results, start):
+    ledger = VoucherLedger(path, compact_every=50)
+    start.wait()
+    won = [code for code in codes if ledger.consume(code)]
+    results.put(won)
+
+
+def save_games(path, proc, n, start):
+    store = ResumeStore(path, min_compact_bytes=4096)
+    start.wait()
+    for step in range(1, 21):
+        for i in range(n):
+            store.save(f"p{proc}-{i}", {"index": step, "score": step * 10})
+    while store._compacting:  # let a running compaction finish before exiting
+        time.sleep(0.01)
+
+
+def submit_scores(kind, path, proc, n, start):
+    store = JsonLeaderboard(path) if kind == "json" else SqliteLeaderboard(path)
+    start.wait()
+    for i in range(n):
+        store.submit("Friends", f"p{proc}-{i}", "0000", 1 + i)
+
+
+def run_all(target, args_for, procs):
+    start = mp.Event()
+    workers = [mp.Process(target=target, args=(*args_for(i), start)) for i in range(procs)]
+    for w in workers:
+        w.start()
+    time.sleep(0.5)
+    t0 = time.perf_counter()
+    start.set()
+    return workers, t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, default=8)
+    ap.add_argument("--codes", type=int, default=200)
+    ap.add_argument("--scores", type=int, default=200)
+    ap.add_argument("--games", type=int, default=50)
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp(prefix="quiz-hammer-")
+    failures = 0
+
+    # ---- vouchers: exactly once ----
+    path = os.path.join(tmp, "vouchers.json")
+    codes = [f"CODE{i:05d}" for i in range(args.codes)]
+    with open(path, "w") as f:
+        json.dump({c: {"type": "early", "redeemed": False, "consumed": False} for c in codes}, f)
+    results = mp.Queue()
+    # every process gets all the codes, rotated so they collide from the start
+    workers, t0 = run_all(redeem_all, lambda i: (path, codes[i:] + codes[:i], results), args.procs)
+    won = []
+    for _ in workers:
+        won.extend(results.get())
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    counts = {c: won.count(c) for c in codes}
+    twice = [c for c, n in counts.items() if n > 1]
+    never = [c for c, n in counts.items() if n == 0]
+    after = VoucherLedger(path).snapshot()
+    unmarked = [c for c in codes if not after[c]["consumed"]]
+    ok = not (twice or never or unmarked)
+    failures += not ok
+    print(f"vouchers: {args.procs} procs x {args.codes} codes in {elapsed:.2f}s -> "
+          f"{len(won)} redemptions, {len(twice)} double, {len(never)} never, {len(unmarked)} unmarked"
+          f"  {'OK' if ok else 'FAIL'}")
+
+    # ---- resume: no lost saves ----
+    path = os.path.join(tmp, "games.json")
+    workers, t0 = run_all(save_games, lambda i: (path, i, args.games), args.procs)
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    store = ResumeStore(path)
+    games = [store.get(f"p{p}-{i}") for p in range(args.procs) for i in range(args.games)]
+    wrong = sum(g is None or (g["index"], g["score"]) != (20, 200) for g in games)
+    ok = not wrong
+    failures += not ok
+    print(f"resume: {args.procs} procs x {args.games} games x 20 saves in {elapsed:.2f}s -> "
+          f"{wrong} wrong or missing  {'OK' if ok else 'FAIL'}")
+
+    # ---- leaderboards: no lost scores ----
+    for kind, name in (("json", "leaderboard.json"), ("sqlite", "leaderboard.db")):
+        path = os.path.join(tmp, name)
+        workers, t0 = run_all(submit_scores, lambda i: (kind, path, i, args.scores), args.procs)
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - t0
+        store = JsonLeaderboard(path) if kind == "json" else SqliteLeaderboard(path)
+        stored = len(store.top_players("Friends", args.procs * args.scores + 1))
+        expected = args.procs * args.scores
+        ok = stored == expected
+        failures += not ok
+        print(f"{kind:6s} leaderboard: {expected} submits from {args.procs} procs in {elapsed:.2f}s -> "
+              f"{stored} stored  {'OK' if ok else 'FAIL'}")
+
+    # ---- cached leaderboards: another worker's score shows up ----
+    for kind, name in (("json", "cached.json"), ("sqlite", "cached.db")):
+        path = os.path.join(tmp, name)
+
+        reads = []
+
+        def cached():
+            store = JsonLeaderboard(path) if kind == "json" else SqliteLeaderboard(path)
+            store = WriteBehindLeaderboard(store, flush_interval=3600, max_batch=10**9)
+            top_players = store.top_players
+            store.top_players = lambda theme, n: reads.append(theme) or top_players(theme, n)
+            return store, CachedLeaderboard(store, k=10, render=repr, recheck_interval=0)
+
+        (own, reader), (_, writer) = cached(), cached()
+        before = reader.markdown("Friends")
+        for score in range(1, 6):
+            reader.submit("Naruto", "here", "0000", score)
+            own.flush()
+            reader.markdown("Friends")
+        own_reads = reads.count("Friends")
+        writer.submit("Friends", "elsewhere", "0000", 42)
+        writer.store.flush()
+        after = reader.markdown("Friends")
+        ok = before == "[]" and own_reads == 1 and after == "[('elsewhere', 42)]"
+        failures += not ok
+        print(f"{kind:6s} cached leaderboard: {own_reads} read(s) across 5 own flushes, "
+              f"other instance's score seen  {'OK' if ok else 'FAIL'}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
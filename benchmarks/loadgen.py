@@ -0,0 +1,348 @@
+"""Concurrent-player load test against a locally launched app.
+
+    python benchmarks/loadgen.py [--players 50] [--duration 60] [--out report.json]
+
+Starts Theme.py on 127.0.0.1 in a subprocess, with PERSISTENT_DIR pointing
+at a fresh temp dir seeded with synthetic vouchers, then drives --players
+virtual players through the real events with gradio_client, each on its
+own session:
+
+    theme click -> (shop -> redeem) -> skip | story -> nickname/PIN
+    -> mixed -> submit / next ... -> Play Again
+
+A "click" calls the event and every .then() chained after it, like the
+browser does, and is timed as one event. Steps that run only in the browser
+(fn=None, js=...) are skipped, so pure navigation clicks never show up in
+the report. While a player is in a run a
+second thread fires the timer tick (handle_timeout) every --tick-every
+seconds. Players answer correctly with probability --accuracy, looking
+answers up in the local question bank; a wrong answer ends the run.
+
+Everything is local and seeded, so a run needs no network and the mix of
+events is the same from one run to the next. The report (JSON on stdout or
+--out, summary on stderr) has per-event p50/p95/p99 latency, counts, error
+counts and throughput.
+"""
+import os
+import sys
+import json
+import time
+import random
+import string
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+os.environ.setdefault("GRADIO_ANALYTICS_ENABLED", "False")
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+from gradio_client import Client  # noqa: E402
+
+import Theme  # noqa: E402  (same Blocks as the server: used to resolve endpoints)
+import engine  # noqa: E402
+
+
+# ---------------------------------------------------------------------------
+# endpoints
+
+def event_chains(demo):
+    """{(component id, event): [api_name, ...]} including .then() successors.
+
+    Browser-only steps have no Python function and are left out.
+    """
+    fns = list(demo.fns.values())
+    after = defaultdict(list)
+    for f in fns:
+        if f.trigger_after is not None:
+            after[f.trigger_after].append(f)
+    chains = {}
+    for f in fns:
+        for block_id, event in f.targets:
+            if block_id is None:
+                continue
+            chain, todo = [], [f]
+            while todo:
+                g = todo.pop(0)
+                if g.fn is not None:
+                    chain.append("/" + g.api_name)
+                todo.extend(after.get(g._id, ()))
+            chains[(block_id, event)] = chain
+    return chains
+
+
+def endpoints():
+    demo = Theme.build_demo(engine.Config.from_env())
+    chains, ui = event_chains(demo), demo.ui
+
+    def click(component, event="click"):
+        return chains[(component._id, event)]
+
+    return {
+        "theme": click(ui.friends_btn),
+        "shop": click(ui.shop_btn),
+        "redeem": click(ui.redeem_btn),
+        "shop_back": click(ui.shop_back),
+        "play": click(ui.start_quiz_btn),
+        "story": click(ui.story_btn),
+        "entry": click(ui.entry_btn),
+        "skip": click(ui.skip_btn),
+        "mixed": click(ui.mixed_btn),
+        "submit": click(ui.submit_btn),
+        "next": click(ui.next_btn),
+        "restart": click(ui.restart_btn),
+        "tick": click(ui.deadline_timer, "tick"),
+    }
+
+
+# ---------------------------------------------------------------------------
+# server
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_vouchers(path, n, rng):
+    alphabet = string.ascii_uppercase + string.digits
+    codes = {}
+    while len(codes) < n:
+        code = "".join(rng.choice(alphabet) for _ in range(8))
+        codes[code] = {"type": rng.choice(["early", "unlimited", "disable"]),
+                       "redeemed": False, "consumed": False}
+    with open(path, "w") as f:
+        json.dump(codes, f, indent=2)
+    return list(codes)
+
+
+def launch(persistent_dir, port, backend, timeout=120):
+    env = dict(os.environ, PERSISTENT_DIR=persistent_dir, LEADERBOARD_BACKEND=backend,
+               SERVER_NAME="127.0.0.1", PORT=str(port))
+    log = open(os.path.join(persistent_dir, "server.log"), "w")
+    proc = subprocess.Popen([sys.executable, "Theme.py"],
+                            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}/"
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if proc.poll() is not None:
+            sys.exit(f"server exited with {proc.returncode}, see {log.name}")
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return proc, url
+        except OSError:
+            time.sleep(0.25)
+    proc.kill()
+    sys.exit(f"server did not come up in {timeout}s, see {log.name}")
+
+
+# ---------------------------------------------------------------------------
+# players
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_examples = {}
+
+    def call(self, client, name, chain, *args):
+        """Run one click (its whole chain). Returns the first call's result, or None on error."""
+        if not chain:
+            return ()  # handled in the browser
+        t0 = time.perf_counter()
+        try:
+            first = client.predict(*args, api_name=chain[0])
+            for api_name in chain[1:]:
+                result = client.predict(api_name=api_name)
+                if first == ():
+                    first = result
+        except Exception as e:
+            with self._lock:
+                self.errors[name] += 1
+                self.error_examples.setdefault(name, repr(e)[:300])
+            return None
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.samples[name].append(elapsed)
+        return first
+
+
+def answers_for(theme):
+    bank = engine.open_bank(engine.Config.from_env())
+    return {q.text: q.answer for q in bank.theme_questions(theme)}
+
+
+def question_text(md):
+    return md.split(": ", 1)[1] if isinstance(md, str) and ": " in md else md
+
+
+def choices_of(update):
+    return [c[1] if isinstance(c, (list, tuple)) else c for c in (update or {}).get("choices", [])]
+
+
+THEME = "Friends"
+
+
+def player(i, url, eps, rec, args, codes, answers, stop_at):
+    rng = random.Random(f"{args.seed}-{i}")
+    client = Client(url, verbose=False)
+    while time.monotonic() < stop_at:
+        rec.call(client, "theme", eps["theme"])
+        if rng.random() < args.voucher_rate:
+            try:
+                code = codes.pop()
+            except IndexError:
+                code = None
+            if code:
+                rec.call(client, "shop", eps["shop"])
+                rec.call(client, "redeem", eps["redeem"], code)
+                rec.call(client, "shop_back", eps["shop_back"])
+        rec.call(client, "play", eps["play"])
+        rec.call(client, "story", eps["story"])
+        if rng.random() < args.leaderboard_rate:
+            rec.call(client, "entry", eps["entry"], f"load{i}", f"{i % 10000:04d}")
+        else:
+            rec.call(client, "skip", eps["skip"])
+
+        out = rec.call(client, "mixed", eps["mixed"], THEME)
+        in_run = threading.Event()
+        in_run.set()
+        ticker = None
+        if args.tick_every > 0:
+            ticker = threading.Thread(target=tick_loop, args=(client, eps, rec, args.tick_every, in_run), daemon=True)
+            ticker.start()
+
+        for _q in range(args.questions):
+            if out is None or time.monotonic() >= stop_at:
+                break
+            text, radio = question_text(out[0]), out[1]
+            options = choices_of(radio)
+            correct = answers.get(text)
+            if correct in options and rng.random() < args.accuracy:
+                pick = correct
+            else:
+                wrong = [o for o in options if o != correct]
+                pick = rng.choice(wrong or options or [None])
+            time.sleep(rng.uniform(args.think_min, args.think_max))
+            rec.call(client, "submit", eps["submit"], pick)
+            if pick != correct:
+                break
+            out = rec.call(client, "next", eps["next"])
+
+        in_run.clear()
+        if ticker is not None:
+            ticker.join()
+        rec.call(client, "restart", eps["restart"])
+
+
+def tick_loop(client, eps, rec, every, in_run):
+    while in_run.is_set():
+        time.sleep(every)
+        if in_run.is_set():
+            rec.call(client, "tick", eps["tick"])
+
+
+# ---------------------------------------------------------------------------
+# report
+
+def percentile_ms(sorted_samples, p):
+    if not sorted_samples:
+        return None
+    k = min(len(sorted_samples) - 1, max(0, round(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[k] * 1e3
+
+
+def report(rec, wall, args):
+    events = {}
+    for name in sorted(set(rec.samples) | set(rec.errors)):
+        s = sorted(rec.samples.get(name, ()))
+        events[name] = {
+            "count": len(s),
+            "errors": rec.errors.get(name, 0),
+            "p50_ms": percentile_ms(s, 50),
+            "p95_ms": percentile_ms(s, 95),
+            "p99_ms": percentile_ms(s, 99),
+            "per_s": len(s) / wall,
+        }
+    total = sum(e["count"] for e in events.values())
+    return {
+        "config": vars(args),
+        "wall_s": wall,
+        "events_per_s": total / wall,
+        "errors": sum(rec.errors.values()),
+        "events": events,
+        "error_examples": rec.error_examples,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--players", type=int, default=50)
+    ap.add_argument("--duration", type=float, default=60.0, help="seconds of play after ramp-up starts")
+    ap.add_argument("--ramp", type=float, default=5.0, help="seconds over which players join")
+    ap.add_argument("--questions", type=int, default=20, help="max questions per run")
+    ap.add_argument("--think-min", type=float, default=0.2)
+    ap.add_argument("--think-max", type=float, default=1.0)
+    ap.add_argument("--accuracy", type=float, default=0.9)
+    ap.add_argument("--tick-every", type=float, default=5.0, help="0 disables timer ticks")
+    ap.add_argument("--voucher-rate", type=float, default=0.1, help="share of runs that redeem a code")
+    ap.add_argument("--leaderboard-rate", type=float, default=0.5, help="share of runs with nickname/PIN")
+    ap.add_argument("--vouchers", type=int, default=1000)
+    ap.add_argument("--backend", default="json", choices=["json", "sqlite"])
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--url", help="drive an already running app instead of launching one")
+    ap.add_argument("--out")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    persistent_dir = tempfile.mkdtemp(prefix="quiz-load-")
+    codes = seed_vouchers(os.path.join(persistent_dir, "vouchers.json"), args.vouchers, rng)
+    proc = None
+    if args.url:
+        url, codes = args.url, []
+    else:
+        proc, url = launch(persistent_dir, free_port(), args.backend)
+    try:
+        eps = endpoints()
+        answers = answers_for(THEME)
+        rec = Recorder()
+        start = time.monotonic()
+        stop_at = start + args.duration
+        threads = []
+        for i in range(args.players):
+            t = threading.Thread(target=player, args=(i, url, eps, rec, args, codes, answers, stop_at), daemon=True)
+            t.start()
+            threads.append(t)
+            time.sleep(args.ramp / max(1, args.players))
+        for t in threads:
+            t.join()
+        result = report(rec, time.monotonic() - start, args)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(30)
+
+    print(f"{args.players} players, {result['wall_s']:.1f}s, {result['events_per_s']:.1f} events/s, "
+          f"{result['errors']} errors", file=sys.stderr)
+    for name, e in result["events"].items():
+        if e["count"]:
+            print(f"  {name:10s} n={e['count']:<6d} err={e['errors']:<4d} p50 {e['p50_ms']:8.1f}  "
+                  f"p95 {e['p95_ms']:8.1f}  p99 {e['p99_ms']:8.1f} ms", file=sys.stderr)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
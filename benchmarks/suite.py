@@ -0,0 +1,222 @@
+"""Hot-path benchmark suite for the quiz engine, with JSON output.
+
+    python benchmarks/suite.py [--sizes 1000,10000,100000,1000000] [--out results.json]
+    python benchmarks/suite.py --compare old.json new.json
+
+Drives the engine directly, no UI or server. All persistent files go to a
+temp dir. For each size N it builds a synthetic N-question theme, an
+N-code voucher file and an N-key leaderboard, then times:
+
+  get_randomized_run (easy / hard / mixed), start, answer, fifty, call,
+  advance, seeded_run (a run cache miss), resume, save_leaderboard,
+  get_leaderboard, redeem
+
+The timed session has a resume token, so the game paths include their
+journal write (resume.py).
+
+Every path gets one untimed warm-up call, then runs until it has used
+--budget seconds or --max-iters calls, and always at least once.
+"""
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import engine  # noqa: E402
+from questions import QuestionBank, QuestionPack, compile_pack, DIFFICULTIES  # noqa: E402
+from vouchers import VoucherLedger  # noqa: E402
+from runpool import RunCache  # noqa: E402
+from leaderboard import JsonLeaderboard, CachedLeaderboard, WriteBehindLeaderboard  # noqa: E402
+
+THEME = "Synthetic"
+
+
+def synthetic_bank(n, rng):
+    records = [{
+        "question": f"Synthetic question {i}?",
+        "options": [f"opt {i}.{j}" for j in range(4)],
+        "answer": f"opt {i}.0",
+        "difficulty": rng.choice(DIFFICULTIES),
+        "category": rng.choice(["Characters", "Plot", "Quotes"]),
+        "tags": [rng.choice("abcdef")],
+        "id": f"synthetic-{i:07d}",
+    } for i in range(n)]
+    data = compile_pack(THEME, records)
+    bank = QuestionBank()
+    bank.add_theme(THEME, QuestionPack(data).count, lambda: data)
+    return bank
+
+
+def synthetic_vouchers(path, n, rng):
+    alphabet = string.ascii_uppercase + string.digits
+    types = ["early", "unlimited", "disable", "fifty", "call"]
+    vouchers = {}
+    while len(vouchers) < n:
+        code = "".join(rng.choice(alphabet) for _ in range(8))
+        vouchers[code] = {"type": rng.choice(types), "redeemed": False, "consumed": False}
+    with open(path, "w") as f:
+        json.dump(vouchers, f, indent=2)
+    return list(vouchers)
+
+
+def synthetic_leaderboard(path, n, rng):
+    data = {f"{THEME}|player{i}|{rng.randrange(10000):04d}": rng.randrange(1, 500) for i in range(n)}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def measure(fn, budget, max_iters):
+    fn()  # warm-up: first-use loads and caches are not what we are timing
+    samples = []
+    start = time.perf_counter()
+    while not samples or (len(samples) < max_iters and time.perf_counter() - start < budget):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "iters": len(samples),
+        "median_us": statistics.median(samples) * 1e6,
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p95_us": samples[max(0, int(len(samples) * 0.95) - 1)] * 1e6,
+        "min_us": samples[0] * 1e6,
+    }
+
+
+def run_size(n, tmp, budget, max_iters):
+    rng = random.Random(n)
+    d = os.path.join(tmp, str(n))
+    os.makedirs(d)
+
+    engine.question_bank = synthetic_bank(n, rng)
+    engine.config.theme_files[THEME] = f"synthetic-{n}"  # start() only takes configured themes
+    engine.run_cache = RunCache(engine.seeded_run, size=engine.config.run_cache_size)
+    vpath = os.path.join(d, "vouchers.json")
+    codes = iter(synthetic_vouchers(vpath, n, rng))
+    engine.voucher_ledger = VoucherLedger(vpath)
+    lpath = os.path.join(d, "leaderboard.json")
+    synthetic_leaderboard(lpath, n, rng)
+    writer = WriteBehindLeaderboard(JsonLeaderboard(lpath), flush_interval=3600, max_batch=10**9)
+    engine.leaderboard_store = CachedLeaderboard(writer, k=engine.LEADERBOARD_TOP_K, render=engine.render_leaderboard)
+
+    s = engine.GameSession()
+    s.token = f"suite-resume-token-{n}"
+    engine.start(s, THEME, "mixed", time.monotonic(), seed=1)
+    stored = engine.browser_state(s)
+    last = len(s.run) - 1
+    answer = engine.question_bank[s.run[0]].answer
+    fifty_code = next(c for c, v in engine.voucher_ledger.snapshot().items() if v["type"] == "fifty")
+    seq = iter(range(10**9))
+
+    def save_and_flush():
+        engine.save_leaderboard(THEME, f"bench{next(seq)}", "0000", 10_000)
+        writer.flush()
+
+    def at(index, voucher="", answered=False):
+        # the paths below change the session; put it back on a live question
+        # (or, for advance, one just answered right) first
+        s.index, s.voucher, s.answered, s.over = index, voucher, answered, False
+        s.deadline = time.monotonic() + engine.QUESTION_SECONDS
+        return s
+
+    def leaderboard_cold():
+        engine.leaderboard_store.invalidate(THEME)
+        engine.get_leaderboard(THEME)
+
+    paths = {
+        "get_randomized_run[easy]": lambda: engine.get_randomized_run(difficulties=engine.RUN_MODES["easy"], theme=THEME),
+        "get_randomized_run[hard]": lambda: engine.get_randomized_run(difficulties=engine.RUN_MODES["hard"], theme=THEME),
+        "get_randomized_run[mixed]": lambda: engine.get_randomized_run(theme=THEME),
+        "start": lambda: engine.start(engine.GameSession(), THEME, "mixed", time.monotonic(), seed=1),
+        "answer": lambda: engine.answer(at(0), answer, time.monotonic()),
+        "fifty": lambda: engine.fifty(at(0)),
+        "call": lambda: engine.call(at(0)),
+        "advance": lambda: (engine.advance(at(0, fifty_code, answered=True), time.monotonic()), engine.lifelines(s)),
+        "advance[game_over]": lambda: engine.advance(at(last, answered=True), time.monotonic()),
+        "seeded_run": lambda: engine.seeded_run(THEME, "mixed", 1),
+        "resume": lambda: engine.resume(engine.GameSession(), stored),
+        "save_leaderboard[buffered]": lambda: engine.save_leaderboard(THEME, f"bench{next(seq)}", "0000", 1),
+        "save_leaderboard[flushed]": save_and_flush,
+        "get_leaderboard[cached]": lambda: engine.get_leaderboard(THEME),
+        "get_leaderboard[cold]": leaderboard_cold,
+        "redeem": lambda: engine.redeem(s, next(codes)),
+    }
+    results = []
+    for name, fn in paths.items():
+        r = measure(fn, budget, max_iters)
+        r.update(name=name, size=n)
+        results.append(r)
+        print(f"  {name:28s} n={n:<8d} median {r['median_us']:12.1f} us  ({r['iters']} iters)", file=sys.stderr)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    for r in new:
+        o = old.get((r["name"], r["size"]))
+        if o:
+            ratio = r["median_us"] / o["median_us"] if o["median_us"] else float("inf")
+            flag = "  SLOWER" if ratio > 1.2 else ""
+            print(f"{r['name']:28s} n={r['size']:<8d} {o['median_us']:12.1f} -> {r['median_us']:12.1f} us  x{ratio:5.2f}{flag}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000,1000000")
+    ap.add_argument("--budget", type=float, default=0.5, help="seconds per path and size")
+    ap.add_argument("--max-iters", type=int, default=1000)
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = ap.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="quiz-bench-")
+    engine.init(engine.Config(persistent_dir=tmp))
+    results = []
+    for n in (int(s) for s in args.sizes.split(",")):
+        results.extend(run_size(n, tmp, args.budget, args.max_iters))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "budget_s": args.budget,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
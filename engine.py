@@ -0,0 +1,837 @@
+"""Quiz engine: questions, runs, stores and the event handlers.
+
+Importing this module reads no files and starts nothing. `init(config)`
+opens the question bank and the stores under `config.persistent_dir`.
+A player's game is one GameSession, advanced by plain functions (start,
+answer, advance, fifty, call, tick, finish) that know nothing about
+Gradio; Theme.py turns their results into component updates. A session
+holds no question list: its run is rebuilt on demand from (theme, mode,
+seed), which the browser also holds, signed (runtoken.py). Each change
+is journaled under the browser's resume token (resume.py), so `resume()`
+can pick a game up again after a page refresh, on any worker. A
+pre-forking server calls `preload()` on the bank in the parent, so every
+worker shares one decoded, indexed copy.
+"""
+import os
+import gc
+import sys
+import time
+import random
+import secrets
+import datetime
+import threading
+import metrics
+from vouchers import VoucherLedger
+from feedback import FeedbackWriter
+from questions import QuestionBank, Run, DIFFICULTIES
+from runpool import RunPool, RunCache
+from runtoken import RunTokens
+from resume import ResumeStore
+from analytics import AnswerStats
+from leaderboard import open_leaderboard, CachedLeaderboard, WriteBehindLeaderboard
+
+# ----------------- Questions -----------------
+THEME_FILES = {
+    "Friends":  "FRIENDS.txt",
+    "Naruto":   "Naruto.txt",
+    "Avengers": "avengers.txt",
+    "The Office": "Office.txt",
+    "The Big Bang Theory": "TBBT.txt"
+}
+
+friend_templates_by_theme = {
+    "Friends": {
+        "Chandler":   "Could it *be* any more obvious? The answer is {answer}.",
+        "Joey":       "How you doin'? The answer is {answer}.",
+        "Monica":     "I've cleaned the data: the answer is {answer}.",
+        "Ross":       "Pivot! The answer is {answer}.",
+        "Phoebe":     "Smelly cat, smelly cat, the answer’s {answer}.",
+    },
+    "The Big Bang Theory": {
+        "Sheldon Cooper":     "Bazinga! Of course the answer is {answer}.",
+        "Leonard Hofstadter": "According to my calculations, the answer is {answer}.",
+        "Howard Wolowitz":    "In zero-G or on Earth, only one constant stands: {answer}.",
+        "Raj Koothrappali":   "I still can’t talk to women… but I can tell you the answer: {answer}.",
+        "Penny":              "Aww, sweetie, the answer is {answer}.",
+    },
+    "The Office": {
+        "Michael Scott":    "That’s what she said: {answer}.",
+        "Jim Halpert":      "Bears. Beets. Battlestar Galactica. Actually, the answer is {answer}.",
+        "Dwight Schrute":   "Now look who needs my help. The answer is: {answer}.",
+        "Pam Beesly":       "I sketched this whole scenario—every line leads back to {answer}.",
+        "Creed Bratton":    "I’m not sure what we’re doing here, but the answer is {answer}.",
+    },
+    "Naruto": {
+        "Naruto Uzumaki":  "Never give up! The answer is {answer}.",
+        "Sasuke Uchiha":   "My vengeance is complete. Now the truth remains: the answer is {answer}.",
+        "Sakura Haruno":   "I will heal all your doubts: the answer is {answer}.",
+        "Kakashi Hatake":  "My Copy-Ninja Technique shows that the answer is {answer}.",
+        "Shikamaru Nara":  "Troublesome… but the answer is {answer}.",
+    },
+    "Avengers": {
+        "Iron Man":       "I am Iron Man—and I’m never wrong. The answer is {answer}.",
+        "Captain America":"I can do this all day. The answer is {answer}.",
+        "Thor":           "By Odin’s beard… it’s {answer}.",
+        "Hulk":           "Hulk SMASH wrong answers. Only {answer} stands.",
+        "Black Panther":  "Wakanda forever, the answer is {answer}.",
+        "Black Widow":    "Tactical analysis shows the right answer is {answer}.",
+    }
+}
+
+
+# ----------------- Config -----------------
+def _env_flag(name):
+    return os.environ.get(name, "").lower() in ("1", "true", "yes", "on")
+
+
+class Config:
+    """Everything the app reads from its environment, in one place.
+
+    `Config.from_env()` reads the same variables the app always has;
+    keyword arguments override single settings (benchmarks, workers).
+    """
+
+    def __init__(self, persistent_dir="/mnt/persistent", leaderboard_backend="json",
+                 theme_files=None, pack_dir="packs", fast_concurrency=64,
+                 persist_concurrency=4, queue_max_size=2048, preload=False,
+                 session_idle_seconds=900.0, max_sessions=5000, run_cache_size=None,
+                 resume_ttl_seconds=86400.0, server_name="0.0.0.0", port=8080):
+        self.persistent_dir = persistent_dir
+        # "json" (default, fine for small installs) or "sqlite"
+        self.leaderboard_backend = leaderboard_backend
+        self.theme_files = dict(theme_files or THEME_FILES)
+        self.pack_dir = pack_dir
+        # Gradio runs one request per event at a time unless told otherwise.
+        # Handlers that only touch memory get `fast_concurrency` each; the
+        # ones that write under persistent_dir share `persist_concurrency`.
+        self.fast_concurrency = fast_concurrency
+        self.persist_concurrency = persist_concurrency
+        self.queue_max_size = queue_max_size
+        # decode and index the whole bank at startup instead of on first use
+        self.preload = preload
+        # a browser session (its game and Gradio's copies of its components)
+        # is dropped after this long without an event, and the least
+        # recently used go first past max_sessions (sessions.py)
+        self.session_idle_seconds = session_idle_seconds
+        self.max_sessions = max_sessions
+        # planned runs of games in progress kept built, one per live session
+        # at least; a game whose run was pushed out (or started on another
+        # worker) rebuilds it from its seed, ~0.5 ms
+        self.run_cache_size = max(run_cache_size or 0, max_sessions)
+        # a game left this long can no longer be resumed after a refresh
+        self.resume_ttl_seconds = resume_ttl_seconds
+        self.server_name = server_name
+        self.port = port
+
+    @classmethod
+    def from_env(cls, **overrides):
+        env = os.environ
+        settings = dict(
+            persistent_dir=env.get("PERSISTENT_DIR", "/mnt/persistent"),
+            leaderboard_backend=env.get("LEADERBOARD_BACKEND", "json"),
+            fast_concurrency=int(env.get("FAST_CONCURRENCY", 64)),
+            persist_concurrency=int(env.get("PERSIST_CONCURRENCY", 4)),
+            queue_max_size=int(env.get("QUEUE_MAX_SIZE", 2048)),
+            preload=_env_flag("PRELOAD"),
+            session_idle_seconds=float(env.get("SESSION_IDLE_SECONDS", 900)),
+            max_sessions=int(env.get("MAX_SESSIONS", 5000)),
+            run_cache_size=int(env.get("RUN_CACHE_SIZE", 0)),
+            resume_ttl_seconds=float(env.get("RESUME_TTL_SECONDS", 86400)),
+            server_name=env.get("SERVER_NAME", "0.0.0.0"),
+            port=int(env.get("PORT", 8080)),
+        )
+        settings.update(overrides)
+        return cls(**settings)
+
+    # Several worker processes may share persistent_dir (see workers.py):
+    # the file stores lock across processes; SQLite is the better
+    # leaderboard backend there.
+    def _file(self, name):
+        return os.path.join(self.persistent_dir, name)
+
+    @property
+    def feedback_file(self):
+        return self._file("feedback.txt")
+
+    @property
+    def leaderboard_file(self):
+        return self._file("leaderboard.json")
+
+    @property
+    def leaderboard_db(self):
+        return self._file("leaderboard.db")
+
+    @property
+    def voucher_file(self):
+        return self._file("vouchers.json")
+
+    @property
+    def analytics_file(self):
+        return self._file("analytics.json")
+
+    @property
+    def resume_file(self):
+        return self._file("games.json")
+
+    @property
+    def run_key_file(self):
+        # HMAC key for run tokens, made on first start; workers sharing
+        # persistent_dir share it, so a token from one verifies on all
+        return self._file("run_token.key")
+
+    @property
+    def max_threads(self):
+        # sync handlers run on this many threads; enough for both pools at once
+        return self.fast_concurrency + self.persist_concurrency
+
+
+# ----------------- Stores -----------------
+# All set by init(config).
+config            = None
+question_bank     = None
+voucher_ledger    = None   # snapshot + journal; lifeline checks from memory
+run_pool          = None
+run_cache         = None   # planned runs of games in progress, by (theme, mode, seed)
+run_tokens        = None   # signs (theme, mode, seed, bank version) for the browser
+feedback_writer   = None   # batched by a background thread, rotated past 5 MB
+leaderboard_store = None   # cached top-K per theme over a write-behind store
+answer_stats      = None   # per-question counters, snapshotted in the background
+game_snapshots    = None   # games in progress by resume token; journaled deltas
+
+# a few runs per (theme, mode) are kept ready so a click just pops one
+RUN_POOL_DEPTH = 8
+# per-theme top 20 and its rendered Markdown live in memory; the store is
+# only read once per theme. New best scores are buffered and written in
+# batches off the request path.
+LEADERBOARD_TOP_K = 20
+LEADERBOARD_FLUSH_SECONDS = 2.0
+LEADERBOARD_FLUSH_BATCH = 50
+# attempts / correct / timeouts / lifelines / time-to-answer per question
+# (theme and position in its file). Offline report:
+# python analytics.py /mnt/persistent/analytics.json Friends=FRIENDS.txt ...
+ANALYTICS_SNAPSHOT_SECONDS = 60.0
+
+# ----------------- Vouchers -----------------
+def load_vouchers():
+    return voucher_ledger.snapshot()
+
+def consume_voucher(code):
+    if not code: return
+    voucher_ledger.consume(code)
+
+VOUCHER_NAMES = {
+    "early":     "Early-Reveal",
+    "unlimited": "Unlimited Lifelines",
+    "disable":   "Disable Timer",
+}
+
+# ----------------- Mix & Shuffle Logic -----------------
+# The rules promise "up to 200 questions"; without a cap a run would be the
+# whole pool, which for big banks costs far more than anyone ever plays.
+MAX_RUN_QUESTIONS = 200
+
+class _Draws:
+    """Sampling without replacement from a few fixed gid arrays.
+
+    Partial Fisher–Yates on each array: a draw swaps the pick with the last
+    live slot, and displaced values live in a small dict so the shared
+    arrays are never copied or mutated. Every draw is O(1).
+    """
+
+    def __init__(self, arrays, rng):
+        self.arrays = arrays
+        self.live = [len(a) for a in arrays]
+        self.moved = [{} for _ in arrays]
+        self.rng = rng
+
+    def total(self):
+        return sum(self.live)
+
+    def _take(self, b, j):
+        a, moved = self.arrays[b], self.moved[b]
+        last = self.live[b] - 1
+        v = moved.get(j, -1)
+        if v < 0:
+            v = a[j]
+        if j != last:
+            w = moved.pop(last, -1)
+            moved[j] = a[last] if w < 0 else w
+        self.live[b] = last
+        return v
+
+    def draw(self, b):
+        """Uniform pick from array `b`."""
+        return self._take(b, self.rng.randrange(self.live[b]))
+
+    def draw_any(self):
+        """Uniform pick across everything still live."""
+        r = self.rng.randrange(self.total())
+        for b, n in enumerate(self.live):
+            if r < n:
+                return self._take(b, r)
+            r -= n
+
+
+def get_randomized_run(n=None, difficulties=None, theme=None, seed=None):
+    # Same run distribution as the original pop/remove version, in O(n).
+    # Pass `seed` to make a run reproducible.
+    rng = random.Random(seed)
+    # 1) Precomputed difficulty buckets (no theme → all themes)
+    buckets = question_bank.difficulty_buckets(theme or None)
+    if n is None:
+        n = MAX_RUN_QUESTIONS
+
+    # 2) Pure-difficulty mode shortcut: a uniform sample, in random order
+    if difficulties:
+        draws = _Draws([buckets[d] for d in DIFFICULTIES if d in difficulties], rng)
+        return question_bank.make_run(draws.draw_any() for _ in range(min(n, draws.total())))
+
+    # 3) Bucket-and-block logic with fallback
+    draws = _Draws([buckets[d] for d in DIFFICULTIES], rng)
+    run = []
+    for _ in range(n // 10):
+        if not draws.total():
+            break
+        block = []
+        # one per difficulty, stepping down to easier ones when empty
+        for i in range(len(DIFFICULTIES)):
+            for b in range(i, -1, -1):
+                if draws.live[b]:
+                    block.append(draws.draw(b))
+                    break
+        # fill out to 10 from whatever remains
+        for _ in range(10 - len(block)):
+            if not draws.total():
+                break
+            block.append(draws.draw_any())
+        rng.shuffle(block)
+        run.extend(block)
+
+    # 4) Any leftover to hit n?
+    for _ in range(min(n - len(run), draws.total())):
+        run.append(draws.draw_any())
+
+    return question_bank.make_run(run)
+
+
+# Difficulty filters behind the Easy / Hard / Mixed buttons
+RUN_MODES = {
+    "easy":  ["easy", "medium"],
+    "hard":  ["hard", "expert"],
+    "mixed": None,
+}
+
+def seeded_run(theme, mode, seed):
+    """The planned Run that `seed` draws for a `mode` game of `theme`.
+
+    The same (theme, mode, seed) gives the same questions in the same
+    option order for as long as question_bank.version(theme) holds.
+    """
+    return Run.plan(get_randomized_run(difficulties=RUN_MODES[mode], theme=theme, seed=seed), seed)
+
+def known_theme(theme):
+    """Is `theme` one of the configured themes? Browser input is checked
+    with this before it reaches the run pool, the buckets or a cache."""
+    return theme in config.theme_files
+
+def make_mode_run(theme, mode):
+    seed = random.getrandbits(32)
+    return seed, seeded_run(theme, mode, seed)
+
+def take_run(theme, mode):
+    """(seed, run) for a new game, from the pool when one is ready."""
+    return run_pool.take(theme, mode)
+
+
+# ----------------- Feedback & Leaderboard -----------------
+def save_feedback(msg):
+    """Queue one feedback message; False when it is empty."""
+    msg = msg.strip()
+    if not msg:
+        return False
+    ts = datetime.datetime.now().isoformat()
+    feedback_writer.submit(f"[{ts}] {msg}\n\n")
+    return True
+
+def render_leaderboard(entries):
+    if not entries:
+        return "## 🏆 Leaderboard\n\n_No scores yet._"
+    rows = [f"**{i}. {nick}** — {pts} pts\n\n" for i, (nick, pts) in enumerate(entries, start=1)]
+    return "## 🏆 Leaderboard\n\n" + "".join(rows)
+
+@metrics.timed("save_leaderboard")
+def save_leaderboard(theme, nick, pin, score):
+    leaderboard_store.submit(theme, nick, pin, score)
+
+@metrics.timed("get_leaderboard")
+def get_leaderboard(theme, top_n=20):
+    if not known_theme(theme):
+        # the theme comes from the browser: nothing is cached for made-up ones
+        return render_leaderboard([])
+    if top_n == LEADERBOARD_TOP_K:
+        return leaderboard_store.markdown(theme)
+    return render_leaderboard(leaderboard_store.top(theme, top_n))
+
+# ----------------- Question Timer -----------------
+# The countdown runs in the browser (Theme.COUNTDOWN_JS); the server only keeps a
+# monotonic deadline per question, enforces it in answer(), and gets one
+# scheduled tick for the early reveal and one at the deadline.
+QUESTION_SECONDS      = 30
+EARLY_REVEAL_SECONDS  = 10
+DEADLINE_GRACE_SECONDS = 1.5   # network slack before a late answer is refused
+
+
+class TickCounter:
+    """Timer ticks served, rolled up per minute. Handlers call `hit` from
+    many threads at once; /metrics reads `gauges()` at every scrape."""
+
+    def __init__(self):
+        self.total = 0
+        self.idle = 0          # ticks that found no live question
+        self.last_minute = 0   # ticks served in the previous full minute
+        self._minute = int(time.monotonic() // 60)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _roll(self, minute):
+        # caller holds self._lock
+        if minute != self._minute:
+            self.last_minute = self._count if minute == self._minute + 1 else 0
+            self._minute, self._count = minute, 0
+
+    def hit(self, idle=False):
+        minute = int(time.monotonic() // 60)
+        with self._lock:
+            self._roll(minute)
+            self._count += 1
+            self.total += 1
+            self.idle += idle
+
+    def gauges(self):
+        minute = int(time.monotonic() // 60)
+        with self._lock:
+            self._roll(minute)
+            return {
+                "timer_ticks_per_minute": (self.last_minute, "Timer ticks served in the previous full minute."),
+                "timer_ticks": (self.total, "Timer ticks served since start."),
+                "timer_ticks_idle": (self.idle, "Timer ticks since start that found no live question."),
+            }
+
+tick_counter = TickCounter()
+metrics.registry.add_collector(tick_counter.gauges)
+
+
+# ----------------- Game Session -----------------
+class GameSession:
+    """Everything the server keeps for one player, held in a single gr.State.
+
+    The functions below take a session and change it in place; they return
+    plain values and never touch Gradio, so the UI decides what to send.
+    """
+
+    __slots__ = (
+        "token", "theme", "mode", "seed", "index", "score", "streak", "streak_active",
+        "fifty_used", "call_used", "deadline", "answered", "over", "timer_running",
+        "early_reveal", "unlimited", "disable_timer", "voucher", "nick", "pin",
+    )
+
+    def __init__(self):
+        self.token = ""              # resume token, kept by the browser
+        self.theme = ""
+        self.mode = ""               # "" between games
+        self.seed = 0                # with theme and mode, picks the run (seeded_run)
+        self.index = 0
+        self.score = 0
+        self.streak = 0
+        self.streak_active = False
+        self.fifty_used = False
+        self.call_used = False
+        self.deadline = 0.0          # time.monotonic() the answer is due by
+        self.answered = False
+        self.over = False            # lost, timed out or finished: only Play Again left
+        self.timer_running = False
+        # shop flags and the redeemed code, for the next run
+        self.early_reveal = False
+        self.unlimited = False
+        self.disable_timer = False
+        self.voucher = ""
+        self.nick = ""
+        self.pin = ""
+
+    @property
+    def run(self):
+        """The planned Run, None between games. Built here if this worker has not got it."""
+        return run_cache.get((self.theme, self.mode, self.seed)) if self.mode else None
+
+    def question(self):
+        return question_bank[self.run[self.index]]
+
+    def options(self):
+        """Options of the current question, in the order planned for this run."""
+        return self.run.options(self.index, self.question())
+
+    def streak_text(self):
+        return f"🔥 Streak: {self.streak} | {'Active ✅' if self.streak_active else 'Inactive'}"
+
+    def nbytes(self):
+        """Rough memory held; the run lives in run_cache, shared and bounded."""
+        return sys.getsizeof(self)
+
+
+POINTS = {"easy": 1, "medium": 2, "hard": 3, "expert": 4}
+
+# answer() outcomes
+UNPICKED, LATE, CORRECT, WRONG, OVER = "unpicked", "late", "correct", "wrong", "over"
+# tick() outcomes
+TIMER_OFF, IDLE, TIMEOUT, REVEAL, WAIT = "off", "idle", "timeout", "reveal", "wait"
+
+
+# ----------------- Resume -----------------
+# What a refreshed page needs to carry on, journaled field by field as it
+# changes (resume.py). A record is written from the first redeem or run
+# start and dropped by Play Again. The run itself comes back from the
+# browser as a signed run token; the record's "seed" only has to match it.
+# "due" is the answer deadline in wall-clock time, so a refresh does not
+# buy a fresh 30 seconds.
+SNAPSHOT_FIELDS = (
+    "index", "score", "streak", "streak_active", "fifty_used",
+    "call_used", "answered", "over", "voucher", "nick", "pin",
+)
+RUN_FIELDS = SNAPSHOT_FIELDS + ("seed", "due")
+
+
+def _field(s, name):
+    if name == "due":
+        return round(time.time() + s.deadline - time.monotonic(), 1)
+    return getattr(s, name)
+
+
+def _journal(s, *fields):
+    if s.token:
+        game_snapshots.save(s.token, {f: _field(s, f) for f in fields})
+
+
+def _valid_token(token):
+    return isinstance(token, str) and 16 <= len(token) <= 64 and token.replace("-", "").replace("_", "").isalnum()
+
+
+def run_token(s):
+    """The signed (theme, mode, seed, bank version) of the game, "" between games."""
+    if not s.mode:
+        return ""
+    return run_tokens.sign(s.theme, s.mode, s.seed, question_bank.version(s.theme))
+
+
+def browser_state(s):
+    """What the browser keeps in localStorage: the resume token and the run token."""
+    return {"id": s.token, "run": run_token(s)}
+
+
+def resume(s, kept):
+    """Attach the browser's resume token to `s` and load the game saved under it.
+
+    `kept` is what browser_state() gave the browser last time. Returns what
+    it should keep now: a new resume token when it had none (or a
+    malformed one). The run is resumed only from a run token this server
+    signed, for the game the record was saved for, drawn from the bank as
+    it is now.
+    """
+    token, signed = (kept.get("id"), kept.get("run")) if isinstance(kept, dict) else (kept, None)
+    if not _valid_token(token):
+        s.token = secrets.token_urlsafe(16)
+        return browser_state(s)
+    s.token = token
+    saved = game_snapshots.get(token)
+    if saved is None:
+        return browser_state(s)
+    for name in SNAPSHOT_FIELDS:
+        if name in saved:
+            setattr(s, name, saved[name])
+    _apply_voucher(s, voucher_ledger.lookup(s.voucher))
+    spec = run_tokens.verify(signed)
+    if spec is not None:
+        theme, mode, seed, version = spec
+        if (seed == saved.get("seed") and mode in RUN_MODES
+                and known_theme(theme) and version == question_bank.version(theme)):
+            s.theme, s.mode, s.seed = theme, mode, seed
+            s.deadline = time.monotonic() + saved.get("due", 0) - time.time()
+            # a deadline that passed meanwhile times out on the first tick
+            s.timer_running = not s.answered and not s.over
+    return browser_state(s)
+
+
+def sign_in(s, nick, pin):
+    """Nickname and PIN for the leaderboard; False unless both are given."""
+    if not nick or not pin:
+        s.nick = s.pin = ""
+        _journal(s, "nick", "pin")
+        return False
+    s.nick, s.pin = nick, pin
+    _journal(s, "nick", "pin")
+    return True
+
+
+def redeem(s, code):
+    """Redeem a shop voucher for the session's next run; returns the message to show."""
+    code = code.strip().upper()
+    v = voucher_ledger.lookup(code)
+    # Mark it consumed immediately so it can never be redeemed again
+    # (consume() refuses a second time)
+    if v is None or v.get("consumed", False) or not voucher_ledger.consume(code):
+        _apply_voucher(s, None)
+        _journal(s, "voucher")
+        return "❌ Invalid code." if v is None else "❌ Code already used."
+    s.voucher = code
+    _apply_voucher(s, v)
+    _journal(s, "voucher")
+    return f"✅ {VOUCHER_NAMES.get(v['type'], v['type'].capitalize())} unlocked!"
+
+
+def _apply_voucher(s, v):
+    """Shop flags for the redeemed voucher record `v` (None clears them)."""
+    kind = v["type"] if v else None
+    s.early_reveal = kind == "early"
+    s.unlimited = kind == "unlimited"
+    s.disable_timer = kind == "disable"
+    if v is None:
+        s.voucher = ""
+
+
+def _present(s, now):
+    s.deadline = now + QUESTION_SECONDS
+    s.answered = False
+    s.timer_running = True
+
+
+def start(s, theme, mode, now, seed=None):
+    """Begin a `mode` game of `theme`: scores and lifelines reset.
+
+    The run is a fresh one from the pool, or the one `seed` draws.
+    Raises ValueError for a theme or mode that is not configured.
+    """
+    if not known_theme(theme) or mode not in RUN_MODES:
+        raise ValueError(f"unknown theme or mode: {theme!r}, {mode!r}")
+    if seed is None:
+        seed, run = take_run(theme, mode)
+        run_cache.put((theme, mode, seed), run)
+    s.theme, s.mode, s.seed = theme, mode, seed
+    s.index = s.score = s.streak = 0
+    s.streak_active = s.fifty_used = s.call_used = s.over = False
+    _present(s, now)
+    _journal(s, *RUN_FIELDS)
+
+
+def first_tick(s, now):
+    """Seconds until the current question's server tick, None with the timer off.
+
+    One tick for the early reveal if it was bought, else one at the deadline.
+    """
+    if s.disable_timer:
+        return None
+    remaining = s.deadline - now
+    return remaining - EARLY_REVEAL_SECONDS if s.early_reveal else remaining
+
+
+def lifelines(s):
+    """(50:50 usable, Call-a-Friend usable): bought unlimited, unused, or a valid voucher."""
+    return (s.unlimited or not s.fifty_used or voucher_ledger.is_available(s.voucher, "fifty"),
+            s.unlimited or not s.call_used or voucher_ledger.is_available(s.voucher, "call"))
+
+
+def advance(s, now):
+    """Move to the next question; False when the game is over.
+
+    Only a correct answer moves on. After a wrong or late answer or a
+    timeout the game is over already, and leaving a question unanswered
+    ends it too.
+    """
+    if s.over or not s.answered:
+        if not s.over:
+            s.over, s.timer_running = True, False
+            _journal(s, "over")
+        return False
+    s.index += 1
+    if s.index >= len(s.run):
+        s.deadline, s.answered, s.timer_running, s.call_used = 0.0, False, False, False
+        s.over = True
+        _journal(s, "index", "answered", "call_used", "over")
+        return False
+    _present(s, now)
+    _journal(s, "index", "answered", "due")
+    return True
+
+
+def answer(s, selected, now):
+    """Judge `selected`. Returns (outcome, restored) where `restored` lists
+    the lifelines ("fifty", "call") a streak just gave back."""
+    if s.over:
+        return OVER, []
+    if s.answered or selected is None:
+        return UNPICKED, []
+    # the browser countdown is cosmetic; this is the real check
+    if not s.disable_timer and now > s.deadline + DEADLINE_GRACE_SECONDS:
+        s.answered, s.timer_running, s.over = True, False, True
+        _journal(s, "answered", "over")
+        return LATE, []
+    q = s.question()
+    answer_stats.record_answer(q, selected == q.answer, QUESTION_SECONDS - (s.deadline - now))
+    s.answered, s.timer_running = True, False
+    if selected != q.answer:
+        s.streak, s.streak_active, s.over = 0, False, True
+        _journal(s, "answered", "over", "streak", "streak_active")
+        return WRONG, []
+
+    earned = POINTS.get(q.difficulty, 1)
+    s.score += earned
+    if s.streak_active:
+        s.streak += earned
+    elif s.fifty_used and s.call_used:
+        # both lifelines used → start a streak
+        s.streak_active, s.streak = True, 0
+    restored = []
+    if s.fifty_used and s.streak >= 25:
+        s.fifty_used = False
+        restored.append("fifty")
+    if s.call_used and s.streak >= 50:
+        s.call_used = False
+        restored.append("call")
+    # if you’ve now restored both, end the streak
+    if not s.fifty_used and not s.call_used:
+        s.streak_active, s.streak = False, 0
+    _journal(s, "answered", "score", "streak", "streak_active", "fifty_used", "call_used")
+    return CORRECT, restored
+
+
+def fifty(s):
+    """50:50 on the current question. Returns (choices, keep_button, streak_broken);
+    `choices` is None when the question has two options or fewer."""
+    q = s.question()
+    s.fifty_used = True
+    if len(q.options) <= 2:
+        _journal(s, "fifty_used")
+        return None, False, False
+    # the reduced choice set was chosen when the run started
+    reduced = s.run.fifty(s.index, q)
+    answer_stats.record_lifeline(q, "fifty")
+    # a valid voucher is spent, and keeps the button on like "unlimited"
+    voucher = voucher_ledger.is_available(s.voucher, "fifty")
+    if voucher:
+        consume_voucher(s.voucher)
+    broken, s.streak_active = s.streak_active, False
+    _journal(s, "fifty_used", "streak_active")
+    return reduced, s.unlimited or voucher, broken
+
+
+def call(s):
+    """Call-a-Friend on the current question. Returns (friend, hint, keep_button)."""
+    q = s.question()
+    answer_stats.record_lifeline(q, "call")
+    # a theme-specific character, or a default friend
+    templates = friend_templates_by_theme.get(s.theme, {"Friend": "I think it's {answer}."})
+    friend = random.choice(list(templates))
+    voucher = voucher_ledger.is_available(s.voucher, "call")
+    if voucher:
+        consume_voucher(s.voucher)
+    s.call_used = True
+    _journal(s, "call_used")
+    return friend, templates[friend].format(answer=q.answer), s.unlimited or voucher
+
+
+def tick(s, now):
+    """The scheduled server tick. Returns (outcome, seconds to the next tick or None)."""
+    live = s.timer_running and not s.answered and not s.disable_timer
+    tick_counter.hit(idle=not live)
+    if s.disable_timer:
+        return TIMER_OFF, None
+    if not live:
+        return IDLE, None
+    remaining = s.deadline - now
+    if remaining <= 0:
+        answer_stats.record_timeout(s.question())
+        s.timer_running, s.over = False, True
+        _journal(s, "over")
+        return TIMEOUT, None
+    if s.early_reveal and remaining <= EARLY_REVEAL_SECONDS + 0.5:
+        return REVEAL, remaining
+    # woke early (timer reused across questions): re-aim at the next event
+    return WAIT, remaining - EARLY_REVEAL_SECONDS if s.early_reveal else remaining
+
+
+def finish(s):
+    """Play Again: record the score, then drop the run and this run's shop flags."""
+    # if they ever redeemed a voucher this run, don’t record them
+    if not s.voucher:
+        save_leaderboard(s.theme, s.nick, s.pin, s.score)
+    s.mode = ""
+    _apply_voucher(s, None)
+    if s.token:
+        game_snapshots.end(s.token)
+        # the player stays signed in for the next game, also in a session
+        # rebuilt from the token (Theme.attached)
+        _journal(s, "nick", "pin")
+
+
+# ----------------- Setup -----------------
+def open_bank(config):
+    # Theme files are compiled into indexed binary packs (rebuilt when the
+    # .txt is newer) and memory-mapped the first time a theme is played.
+    # Runs are arrays of global question ids into the bank.
+    return QuestionBank.from_packs(config.theme_files, config.pack_dir)
+
+
+def preload(bank):
+    """Decode every question and build every difficulty index now.
+
+    For a parent process about to fork workers: the children inherit the
+    finished tables copy-on-write instead of each building its own on first
+    use. gc.freeze() then parks everything allocated so far outside the
+    collector, so a collection in a child does not write to (and copy) the
+    pages the bank lives on.
+    """
+    bank.preload()
+    gc.freeze()
+    return bank
+
+
+def init(cfg, bank=None):
+    """Open the bank and the stores for `cfg`. Pass `bank` to reuse a preloaded one.
+
+    Stores only open their files on first use and start their background
+    threads on first write, so this is safe to call in a freshly forked
+    worker.
+    """
+    global config, question_bank, voucher_ledger, run_pool, run_cache, run_tokens, feedback_writer, \
+        leaderboard_store, answer_stats, game_snapshots
+    if bank is None:
+        bank = open_bank(cfg)
+        if cfg.preload:
+            preload(bank)
+    config = cfg
+    question_bank = bank
+    voucher_ledger = VoucherLedger(cfg.voucher_file)
+    run_pool = RunPool(make_mode_run, depth=RUN_POOL_DEPTH)
+    run_cache = RunCache(seeded_run, size=cfg.run_cache_size)
+    run_tokens = RunTokens.from_file(cfg.run_key_file)
+    feedback_writer = FeedbackWriter(cfg.feedback_file)
+    leaderboard_store = CachedLeaderboard(
+        WriteBehindLeaderboard(
+            open_leaderboard(cfg.leaderboard_backend, cfg.leaderboard_file, cfg.leaderboard_db),
+            flush_interval=LEADERBOARD_FLUSH_SECONDS,
+            max_batch=LEADERBOARD_FLUSH_BATCH,
+        ),
+        k=LEADERBOARD_TOP_K,
+        render=render_leaderboard,
+    )
+    answer_stats = AnswerStats(cfg.analytics_file, snapshot_interval=ANALYTICS_SNAPSHOT_SECONDS)
+    game_snapshots = ResumeStore(cfg.resume_file, ttl=cfg.resume_ttl_seconds)
+
+
+def store_gauges():
+    """Counters of the stores `init` opened, read at every scrape."""
+    gauges = {}
+    for store in (run_pool, run_cache, feedback_writer):
+        if store is not None:
+            gauges.update(store.gauges())
+    return gauges
+
+metrics.registry.add_collector(store_gauges)
@@ -0,0 +1,120 @@
+import os
+import gzip
+import queue
+import atexit
+import shutil
+import datetime
+import threading
+
+from persist import file_lock
+from metrics import record_io
+
+
+class FeedbackWriter:
+    """Appends feedback entries from a background thread.
+
+    `submit` puts the entry on a bounded queue and returns. The writer
+    thread drains whatever is queued into a single write + fsync at most
+    every `flush_interval` seconds. When the active file would grow past
+    `max_bytes` it is renamed to `<name>.<timestamp><ext>` and gzipped, and
+    a fresh file is started.
+
+    When the queue is full `submit` waits up to `put_timeout` seconds for
+    room (back-pressure) and then drops the entry, counting it in `dropped` (quiz_feedback_dropped).
+    """
+
+    def __init__(self, path, flush_interval=1.0, max_queue=1000,
+                 max_bytes=5 * 1024 * 1024, put_timeout=0.05):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.put_timeout = put_timeout
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._start_lock = threading.Lock()
+        self._closing = threading.Event()
+        self._thread = None
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, entry):
+        """Queue one entry. Returns False if it had to be dropped."""
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put(entry, timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _drain(self, first):
+        batch = [first]
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            batch = self._drain(entry)
+            stop = None in batch
+            self._write([e for e in batch if e is not None])
+            if stop:
+                return
+            self._closing.wait(self.flush_interval)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        data = "".join(batch).encode("utf-8")
+        # other worker processes may append to / rotate the same file
+        with file_lock(self.path):
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            if size and size + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        record_io("write", self.path, len(data))
+        self.written += len(batch)
+
+    def _rotate(self):
+        root, ext = os.path.splitext(self.path)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        closed = f"{root}.{stamp}{ext}"
+        os.replace(self.path, closed)
+        with open(closed, "rb") as src, gzip.open(closed + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.unlink(closed)
+        self.rotations += 1
+
+    def gauges(self):
+        return {
+            "feedback_written": (self.written, "Feedback entries written since start."),
+            "feedback_dropped": (self.dropped, "Feedback entries dropped because the queue was full."),
+            "feedback_rotations": (self.rotations, "Feedback files rotated out and gzipped since start."),
+        }
+
+    def close(self, timeout=5.0):
+        """Write out everything still queued and stop the thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._closing.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
@@ -0,0 +1,474 @@
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from persist import atomic_write_json, file_lock
+from metrics import record_io
+
+log = logging.getLogger(__name__)
+
+_UNSEEN = object()  # CachedLeaderboard has not asked for a version yet
+
+
+class _OwnWrites:
+    """The version steps a store's own writes made, newest `keep` of them.
+
+    Lets a cache in front of the store tell its own flushes (whose scores
+    it already holds) from another process's writes.
+    """
+
+    def __init__(self, keep=256):
+        self.keep = keep
+        self._steps = OrderedDict()  # version after -> version before
+        self._lock = threading.Lock()
+
+    def note(self, before, after):
+        if before == after:
+            return
+        with self._lock:
+            self._steps[after] = before
+            if len(self._steps) > self.keep:
+                self._steps.popitem(last=False)
+
+    def only_ours(self, since, now):
+        """True if every write between versions `since` and `now` was ours."""
+        with self._lock:
+            for _ in range(len(self._steps)):
+                if now == since:
+                    return True
+                if now not in self._steps:
+                    return False
+                now = self._steps[now]
+            return now == since
+
+
+class JsonLeaderboard:
+    """The original store: one JSON object keyed by "theme|nick|pin".
+
+    Writes are read-modify-write under an flock on `<path>.lock`, so worker
+    processes sharing the file don't drop each other's scores.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._own = _OwnWrites()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+            record_io("read", self.path, f.tell())
+        return data
+
+    def submit(self, theme, nick, pin, score):
+        """Keep the player's best score. Returns True if it was stored."""
+        key = f"{theme}|{nick}|{pin}"
+        with file_lock(self.path):
+            before = self.version()
+            data = self._read()
+            if score > data.get(key, 0):
+                data[key] = score
+                atomic_write_json(self.path, data, indent=2)
+                self._own.note(before, self.version())
+                return True
+        return False
+
+    def submit_many(self, rows):
+        """Apply (theme, nick, pin, score) rows with one read and one write."""
+        with file_lock(self.path):
+            before = self.version()
+            data = self._read()
+            changed = False
+            for theme, nick, pin, score in rows:
+                key = f"{theme}|{nick}|{pin}"
+                if score > data.get(key, 0):
+                    data[key] = score
+                    changed = True
+            if changed:
+                atomic_write_json(self.path, data, indent=2)
+                self._own.note(before, self.version())
+
+    def top_players(self, theme, n=20):
+        """[(nick, pin, score)] for `theme`, best first, anonymous entries dropped."""
+        entries = []
+        prefix = theme + "|"
+        for full_key, pts in self._read().items():
+            if full_key.startswith(prefix):
+                _theme, nick, pin = full_key.split("|", 2)
+                if nick.strip():
+                    entries.append((nick, pin, pts))
+        return sorted(entries, key=lambda e: e[2], reverse=True)[:n]
+
+    def top(self, theme, n=20):
+        """[(nick, score)] for `theme`, best first, anonymous entries dropped."""
+        return [(nick, pts) for nick, _pin, pts in self.top_players(theme, n)]
+
+    def version(self):
+        """Changes whenever the file is rewritten, by any process."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # atomic_write_json renames a new file in, so the inode moves too
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def wrote(self, since, now):
+        """Did only this object write between versions `since` and `now`?"""
+        return self._own.only_ours(since, now)
+
+
+class SqliteLeaderboard:
+    """SQLite (WAL) store with a (theme, score DESC) index.
+
+    Writes are an upsert that only replaces a lower score, bumping a
+    version counter in `meta` in the same transaction when a row changed;
+    reads are an indexed LIMIT query. One connection per thread. If `import_json`
+    names an existing JSON leaderboard and the table is empty on first use,
+    it is migrated once.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scores (
+            theme TEXT NOT NULL,
+            nick  TEXT NOT NULL,
+            pin   TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            PRIMARY KEY (theme, nick, pin)
+        );
+        CREATE INDEX IF NOT EXISTS scores_theme_score ON scores (theme, score DESC);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+    """
+
+    def __init__(self, path, import_json=None):
+        self.path = path
+        self.import_json = import_json
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+        self._own = _OwnWrites()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            if not self._ready:
+                with self._init_lock:
+                    if not self._ready:
+                        conn.executescript(self.SCHEMA)
+                        if self.import_json and os.path.exists(self.import_json) and self.is_empty():
+                            migrate_json_to_sqlite(self.import_json, self.path)
+                        self._ready = True
+        return conn
+
+    UPSERT = ("INSERT INTO scores (theme, nick, pin, score) VALUES (?, ?, ?, ?) "
+              "ON CONFLICT (theme, nick, pin) DO UPDATE SET score = excluded.score "
+              "WHERE excluded.score > scores.score")
+
+    def submit(self, theme, nick, pin, score):
+        if score <= 0:
+            return False
+        return self.submit_many([(theme, nick, pin, score)]) > 0
+
+    def submit_many(self, rows):
+        """Bulk upsert of (theme, nick, pin, score) rows in one transaction.
+        Returns how many rows changed."""
+        conn = self._conn()
+        record_io("write", self.path)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            changed = conn.executemany(self.UPSERT, [r for r in rows if r[3] > 0]).rowcount
+            version = None
+            if changed > 0:
+                version = conn.execute(
+                    "UPDATE meta SET value = value + 1 WHERE key = 'version' RETURNING value").fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if version is not None:
+            self._own.note(version - 1, version)
+        return changed
+
+    def top_players(self, theme, n=20):
+        record_io("read", self.path)
+        rows = self._conn().execute(
+            "SELECT nick, pin, score FROM scores "
+            "WHERE theme = ? AND trim(nick) != '' "
+            "ORDER BY score DESC, rowid LIMIT ?",
+            (theme, n),
+        )
+        return rows.fetchall()
+
+    def top(self, theme, n=20):
+        return [(nick, pts) for nick, _pin, pts in self.top_players(theme, n)]
+
+    def version(self):
+        """Bumped by every write that changed a score, from any process."""
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def wrote(self, since, now):
+        """Did only this object write between versions `since` and `now`?"""
+        return self._own.only_ours(since, now)
+
+    def is_empty(self):
+        return self._conn().execute("SELECT 1 FROM scores LIMIT 1").fetchone() is None
+
+
+class WriteBehindLeaderboard:
+    """Buffers submits in memory and applies them to `store` in batches.
+
+    Scores for the same player are coalesced to the best one. A background
+    thread flushes every `flush_interval` seconds, or as soon as
+    `max_batch` players are pending, via the store's `submit_many` (one
+    atomic rewrite for the JSON store, one transaction for SQLite). Pending
+    scores are also flushed before any read and at interpreter exit.
+    """
+
+    def __init__(self, store, flush_interval=2.0, max_batch=50):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # (theme, nick, pin) -> best score
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="leaderboard-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:  # keep the writer alive; scores stay pending
+                log.exception("leaderboard flush failed")
+
+    def submit(self, theme, nick, pin, score):
+        if score <= 0:
+            return False
+        key = (theme, nick, pin)
+        with self._lock:
+            if score <= self._pending.get(key, 0):
+                return False
+            self._pending[key] = score
+            if self._thread is None:
+                self._start()
+            if len(self._pending) >= self.max_batch:
+                self._wake.set()
+        return True
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                self.store.submit_many([(*key, score) for key, score in batch.items()])
+            except BaseException:
+                with self._lock:
+                    for key, score in batch.items():
+                        if score > self._pending.get(key, 0):
+                            self._pending[key] = score
+                raise
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+    def top_players(self, theme, n=20):
+        self.flush()
+        return self.store.top_players(theme, n)
+
+    def top(self, theme, n=20):
+        self.flush()
+        return self.store.top(theme, n)
+
+    def version(self):
+        return self.store.version()
+
+    def wrote(self, since, now):
+        return self.store.wrote(since, now)
+
+
+class CachedLeaderboard:
+    """Per-theme top-K kept in memory in front of a store.
+
+    A theme's board is read from the store once; after that `submit` only
+    touches it when the new score enters the top K (or improves an entry
+    already on it). `markdown()` memoizes `render(entries)` per theme and
+    drops the memo whenever that theme's board changes, so a page view is
+    a dict lookup.
+
+    Other worker processes write to the same store, so reads ask the
+    store for its `version()` (file signature, SQLite version counter) at
+    most every `recheck_interval` seconds, and drop every board when it
+    moved for any reason but our own writes (`store.wrote`), whose scores
+    the boards hold already. A board is read from the store outside the
+    lock; submits that arrive meanwhile are applied once it is in.
+    """
+
+    def __init__(self, store, k=20, render=None, recheck_interval=1.0):
+        self.store = store
+        self.k = k
+        self.render = render
+        self.recheck_interval = recheck_interval
+        self._lock = threading.Lock()
+        self._boards = {}    # theme -> [(nick, pin, score)], best first
+        self._markdown = {}  # theme -> rendered board
+        self._loading = {}   # theme -> submits seen while its board is being read
+        self._epoch = 0      # bumped whenever every board is dropped
+        self._version = _UNSEEN
+        self._checked_at = None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.recheck_interval:
+            return
+        self._checked_at = now
+        version = self.store.version()
+        if version == self._version:
+            return
+        with self._lock:
+            since, self._version = self._version, version
+            if since is not _UNSEEN and self.store.wrote(since, version):
+                return  # only our own flushes
+            self._epoch += 1
+            self._boards.clear()
+            self._markdown.clear()
+
+    def _board(self, theme):
+        board = self._boards.get(theme)
+        if board is not None:
+            return board
+        with self._lock:
+            board = self._boards.get(theme)
+            if board is not None:
+                return board
+            late = self._loading.setdefault(theme, [])
+            epoch = self._epoch
+        board = list(self.store.top_players(theme, self.k))
+        with self._lock:
+            if self._loading.get(theme) is late:
+                del self._loading[theme]
+            current = self._boards.get(theme)
+            if current is not None:
+                return current
+            for entry in late:
+                self._place(board, theme, *entry)
+            if epoch == self._epoch:
+                self._boards[theme] = board
+        return board
+
+    def _offer(self, theme, nick, pin, score):
+        # caller holds self._lock
+        if not nick.strip():
+            return
+        board = self._boards.get(theme)
+        if board is None:
+            late = self._loading.get(theme)
+            if late is not None:
+                late.append((nick, pin, score))
+            return
+        self._place(board, theme, nick, pin, score)
+
+    def _place(self, board, theme, nick, pin, score):
+        for i, (n, p, s) in enumerate(board):
+            if n == nick and p == pin:
+                if score <= s:
+                    return
+                del board[i]
+                break
+        else:
+            if len(board) >= self.k and score <= board[-1][2]:
+                return
+        pos = 0
+        while pos < len(board) and board[pos][2] >= score:
+            pos += 1
+        board.insert(pos, (nick, pin, score))
+        del board[self.k:]
+        self._markdown.pop(theme, None)
+
+    def submit(self, theme, nick, pin, score):
+        stored = self.store.submit(theme, nick, pin, score)
+        if stored:
+            with self._lock:
+                self._offer(theme, nick, pin, score)
+        return stored
+
+    def top_players(self, theme, n=20):
+        if n > self.k:
+            return self.store.top_players(theme, n)
+        self._refresh()
+        board = self._board(theme)
+        with self._lock:
+            return board[:n]
+
+    def top(self, theme, n=20):
+        return [(nick, pts) for nick, _pin, pts in self.top_players(theme, n)]
+
+    def markdown(self, theme):
+        self._refresh()
+        md = self._markdown.get(theme)
+        if md is None:
+            board = self._board(theme)
+            with self._lock:
+                md = self._markdown[theme] = self.render([(nick, pts) for nick, _pin, pts in board])
+        return md
+
+    def invalidate(self, theme=None):
+        with self._lock:
+            if theme is None:
+                self._boards.clear()
+                self._markdown.clear()
+            else:
+                self._boards.pop(theme, None)
+                self._markdown.pop(theme, None)
+
+
+def migrate_json_to_sqlite(json_path, sqlite_path):
+    """One-shot import of a `theme|nick|pin` JSON leaderboard. Returns rows read."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rows = []
+    for key, score in data.items():
+        parts = key.split("|", 2)
+        if len(parts) == 3:
+            rows.append((*parts, score))
+    SqliteLeaderboard(sqlite_path).submit_many(rows)
+    return len(rows)
+
+
+def open_leaderboard(backend, json_path, sqlite_path):
+    """Build the configured store. A fresh SQLite store imports the JSON file once."""
+    if backend == "json":
+        return JsonLeaderboard(json_path)
+    if backend == "sqlite":
+        return SqliteLeaderboard(sqlite_path, import_json=json_path)
+    raise ValueError(f"unknown leaderboard backend: {backend!r}")
+
+
+if __name__ == "__main__":
+    # python leaderboard.py leaderboard.json leaderboard.db
+    if len(sys.argv) != 3:
+        sys.exit("usage: python leaderboard.py <leaderboard.json> <leaderboard.db>")
+    print(f"migrated {migrate_json_to_sqlite(sys.argv[1], sys.argv[2])} scores")
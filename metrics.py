@@ -0,0 +1,226 @@
+import os
+import time
+import bisect
+import logging
+import inspect
+import functools
+import threading
+
+log = logging.getLogger(__name__)
+_IMPORTED = time.monotonic()
+
+# Off unless METRICS_ENABLED=1; when off, `timed` hands back the function
+# untouched and `record_io` returns at once.
+ENABLED = os.environ.get("METRICS_ENABLED", "").lower() in ("1", "true", "yes", "on")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def process_started():
+    """The time.monotonic() reading at which this process started, so a cold
+    start counts interpreter start-up and imports too. Where there is no
+    /proc, the time this module was imported."""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            # starttime, in clock ticks since boot: field 22, the 20th after "(comm)"
+            ticks = int(f.read().rsplit(b")", 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _IMPORTED
+    return time.monotonic() - age
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout."""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "exceptions", "_lock")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.exceptions = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, failed=False):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+            if failed:
+                self.exceptions += 1
+
+
+class Registry:
+    """Per-callback latency histograms, persistent-file I/O counters and gauges.
+
+    Rendered in the Prometheus text format by `render()`, and served by
+    `mount(app)` as GET /metrics on the FastAPI app under Gradio.
+    """
+
+    def __init__(self, enabled=ENABLED, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._callbacks = {}  # name -> Histogram
+        self._io = {}         # (op, file) -> [calls, bytes]
+        self._gauges = {}     # name -> (value, help)
+        self._collectors = [] # callables returning {name: (value, help)}, read per scrape
+
+    def _histogram(self, name):
+        h = self._callbacks.get(name)
+        if h is None:
+            with self._lock:
+                h = self._callbacks.setdefault(name, Histogram(self.buckets))
+        return h
+
+    def timed(self, name):
+        """Decorator: time every call of the function under `name`."""
+        def wrap(fn):
+            return self.instrument(name, fn)
+        return wrap
+
+    def instrument(self, name, fn):
+        if not self.enabled or fn is None or inspect.isgeneratorfunction(fn):
+            return fn
+        h = self._histogram(name)
+
+        @functools.wraps(fn)
+        def timed_fn(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                h.observe(time.perf_counter() - t0, failed=True)
+                raise
+            h.observe(time.perf_counter() - t0)
+            return result
+        return timed_fn
+
+    def instrument_blocks(self, demo):
+        """Wrap every event handler registered on `demo`, named by api_name."""
+        if not self.enabled:
+            return
+        for block_fn in demo.fns.values():
+            if block_fn.fn is not None and not hasattr(block_fn.fn, "__wrapped__"):
+                block_fn.fn = self.instrument(block_fn.api_name or block_fn.name, block_fn.fn)
+
+    def record_io(self, op, path, nbytes=0):
+        if not self.enabled:
+            return
+        key = (op, os.path.basename(path))
+        with self._lock:
+            c = self._io.get(key)
+            if c is None:
+                c = self._io[key] = [0, 0]
+            c[0] += 1
+            c[1] += nbytes
+
+    def set_gauge(self, name, value, help=""):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = (value, help)
+
+    def add_collector(self, collect):
+        """Export what `collect()` returns ({name: (value, help)}) as gauges,
+        read at every scrape instead of pushed with set_gauge."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._collectors.append(collect)
+
+    def time_first_request(self, app, since):
+        """Log, and export as quiz_ready_seconds / quiz_cold_start_seconds, the
+        time from `since` (a time.monotonic() reading) until `app` accepts
+        requests and until it sends its first response."""
+        app.add_middleware(_FirstResponse, registry=self, since=since)
+
+    def render(self):
+        out = [
+            "# HELP quiz_callback_seconds Event handler latency.",
+            "# TYPE quiz_callback_seconds histogram",
+        ]
+        with self._lock:
+            callbacks = sorted(self._callbacks.items())
+            io = sorted((k, list(v)) for k, v in self._io.items())
+            gauges = dict(self._gauges)
+            collectors = list(self._collectors)
+        for collect in collectors:
+            gauges.update(collect())
+        gauges = sorted(gauges.items())
+        for name, h in callbacks:
+            with h._lock:
+                counts, total, count = list(h.counts), h.sum, h.count
+            running = 0
+            for le, n in zip(h.buckets, counts):
+                running += n
+                out.append(f'quiz_callback_seconds_bucket{{callback="{name}",le="{le}"}} {running}')
+            out.append(f'quiz_callback_seconds_bucket{{callback="{name}",le="+Inf"}} {count}')
+            out.append(f'quiz_callback_seconds_sum{{callback="{name}"}} {total:.6f}')
+            out.append(f'quiz_callback_seconds_count{{callback="{name}"}} {count}')
+        out += [
+            "# HELP quiz_callback_exceptions_total Event handler calls that raised.",
+            "# TYPE quiz_callback_exceptions_total counter",
+        ]
+        out += [f'quiz_callback_exceptions_total{{callback="{name}"}} {h.exceptions}' for name, h in callbacks]
+        out += [
+            "# HELP quiz_io_calls_total Reads and writes of persistent files.",
+            "# TYPE quiz_io_calls_total counter",
+        ]
+        out += [f'quiz_io_calls_total{{op="{op}",file="{f}"}} {calls}' for (op, f), (calls, _b) in io]
+        out += [
+            "# HELP quiz_io_bytes_total Bytes read and written to persistent files.",
+            "# TYPE quiz_io_bytes_total counter",
+        ]
+        out += [f'quiz_io_bytes_total{{op="{op}",file="{f}"}} {nbytes}' for (op, f), (_c, nbytes) in io]
+        for name, (value, help) in gauges:
+            out += [f"# HELP quiz_{name} {help}", f"# TYPE quiz_{name} gauge", f"quiz_{name} {value}"]
+        return "\n".join(out) + "\n"
+
+    def mount(self, app, path="/metrics"):
+        """Add GET `path` to a FastAPI app (Gradio's `demo.app` after launch)."""
+        if not self.enabled:
+            return
+        from fastapi.responses import PlainTextResponse
+
+        def metrics_endpoint():
+            return PlainTextResponse(self.render(), media_type="text/plain; version=0.0.4")
+        app.add_api_route(path, metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+
+class _FirstResponse:
+    """ASGI middleware behind `Registry.time_first_request`; a pass-through once it has fired."""
+
+    def __init__(self, app, registry, since):
+        self.app = app
+        self.registry = registry
+        self.since = since
+        self.done = False
+
+    def _mark(self, what, gauge, help):
+        seconds = time.monotonic() - self.since
+        log.info("%s %.2fs after start", what, seconds)
+        self.registry.set_gauge(gauge, f"{seconds:.6f}", help)
+
+    async def __call__(self, scope, receive, send):
+        if self.done or scope["type"] not in ("http", "lifespan"):
+            return await self.app(scope, receive, send)
+
+        async def send_first(message):
+            if message["type"] == "lifespan.startup.complete":
+                self._mark("accepting requests", "ready_seconds",
+                           "Time from process start to accepting requests.")
+            elif message["type"] == "http.response.start" and not self.done:
+                self.done = True
+                self._mark(f"first request ({scope['path']}) served", "cold_start_seconds",
+                           "Time from process start to the first response.")
+            await send(message)
+        await self.app(scope, receive, send_first)
+
+
+registry = Registry()
+timed = registry.timed
+record_io = registry.record_io
@@ -0,0 +1,235 @@
+import os
+import json
+import fcntl
+import tempfile
+import threading
+import contextlib
+
+from metrics import record_io
+
+
+def _write_temp(path, write):
+    """`write(f)` into a fsynced temp file next to `path`; returns its name."""
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix="." + os.path.basename(path) + "-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+            record_io("write", path, f.tell())
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp
+
+
+def _json_writer(obj, dump_kwargs):
+    def write(f):
+        with open(f.fileno(), "w", encoding="utf-8", closefd=False) as text:
+            json.dump(obj, text, **dump_kwargs)
+    return write
+
+
+def atomic_write_json(path, obj, **dump_kwargs):
+    """Write `obj` as JSON to a temp file next to `path`, fsync, then os.replace.
+
+    Readers see either the old file or the new one, never a partial write.
+    """
+    tmp = _write_temp(path, _json_writer(obj, dump_kwargs))
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def file_signature(path):
+    """(inode, mtime_ns, size) of `path`, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive cross-process lock for `path` (flock on `<path>.lock`).
+
+    Guards read-modify-write cycles when several worker processes share
+    PERSISTENT_DIR. Blocks until the lock is free; released on exit or
+    when the holder dies.
+    """
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # closing the descriptor drops the lock
+
+
+class JournaledStore:
+    """A JSON snapshot (`path`) plus an append-only journal of JSON lines.
+
+    The state is a dict, `self.data`: the snapshot with every journal line
+    applied in order by the subclass's `_apply(entry)`. Applying a line
+    twice must change nothing, since after a crash mid-compaction lines
+    already in the snapshot are replayed. Subclasses append their own
+    lines (`_encode`) under `<path>.lock` and decide when to compact.
+
+    `_sync()` picks up what other processes did since the last call:
+    their appended lines, or their compaction (a new snapshot or journal
+    file, told apart by inode). Every method starting with an underscore
+    expects the caller to hold `self._lock`, except `_compact_in_background`.
+
+    `compact()` writes the new snapshot with no lock held, so appends in
+    this process and others go on meanwhile. Then, under `self._lock` and
+    the exclusive flock, the lines appended since are copied to a new
+    journal file, and both files are renamed into place. A process that
+    keeps the journal open notices the new inode after taking the flock
+    (`_journal_moved`).
+    """
+
+    SNAPSHOT_FORMAT = {}  # json.dump keyword arguments for the snapshot
+
+    def __init__(self, path, journal_path=None):
+        self.path = path
+        self.journal_path = journal_path or path + ".journal"
+        self._lock = threading.RLock()
+        self.data = {}
+        self._loaded = False
+        self._snapshot_sig = None
+        self._snapshot_bytes = 0
+        self._journal_ino = None   # the journal file we replayed
+        self._journal_offset = 0   # replayed up to here
+        self._journal_entries = 0  # lines replayed since the snapshot
+        self._compacting = False
+
+    @staticmethod
+    def _encode(entry):
+        return (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def _apply(self, entry):
+        raise NotImplementedError
+
+    def _snapshot_data(self):
+        """What the next snapshot holds; a copy, since it is written unlocked."""
+        return {key: dict(value) for key, value in self.data.items()}
+
+    def _pruned(self):
+        """Called after a compaction, to drop what the snapshot left out."""
+
+    # ---- loading / replay ----
+
+    def _load(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        try:
+            with open(self.path, "rb") as f:
+                self.data = json.load(f)
+                self._snapshot_bytes = f.tell()
+            record_io("read", self.path, self._snapshot_bytes)
+        except FileNotFoundError:
+            self.data, self._snapshot_bytes = {}, 0
+        self._snapshot_sig = file_signature(self.path)
+        self._journal_ino = None
+        self._journal_offset = self._journal_entries = 0
+        self._loaded = True
+        self._replay()
+
+    def _replay(self):
+        """Apply journal lines past the last offset we have seen."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                self._journal_ino = os.fstat(f.fileno()).st_ino
+                f.seek(self._journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        record_io("read", self.journal_path, len(data))
+        end = data.rfind(b"\n") + 1  # ignore a torn trailing line
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            self._apply(entry)
+            self._journal_entries += 1
+        self._journal_offset += end
+
+    def _sync(self):
+        if not self._loaded or file_signature(self.path) != self._snapshot_sig:
+            self._load()  # first use, or compacted elsewhere
+            return
+        sig = file_signature(self.journal_path)
+        ino, size = (sig[0], sig[2]) if sig else (None, 0)
+        if (self._journal_ino is not None and ino != self._journal_ino) or size < self._journal_offset:
+            self._load()
+        elif size > self._journal_offset:
+            self._replay()
+
+    def _journal_moved(self, fd):
+        """Has a compaction replaced the journal `fd` has open? Hold the flock."""
+        try:
+            return os.fstat(fd).st_ino != os.stat(self.journal_path).st_ino
+        except FileNotFoundError:
+            return True
+
+    # ---- compaction ----
+
+    def _compact_in_background(self, name):
+        # caller holds self._lock
+        if not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact, name=name, daemon=True).start()
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot; lines appended meanwhile are kept."""
+        try:
+            with self._lock:
+                self._sync()
+                data = self._snapshot_data()
+                sig, ino, covered = self._snapshot_sig, self._journal_ino, self._journal_offset
+            tmp = _write_temp(self.path, _json_writer(data, self.SNAPSHOT_FORMAT))
+            try:
+                with self._lock, file_lock(self.path):
+                    self._sync()
+                    if self._snapshot_sig != sig or self._journal_ino != ino:
+                        return  # another process compacted first
+                    self._swap(tmp, covered)
+                    tmp = None
+                    self._pruned()
+            finally:
+                if tmp is not None:
+                    os.unlink(tmp)
+        finally:
+            self._compacting = False
+
+    def _rewrite(self):
+        """Snapshot everything now and start an empty journal. Hold both locks."""
+        self._sync()
+        tmp = _write_temp(self.path, _json_writer(self._snapshot_data(), self.SNAPSHOT_FORMAT))
+        self._swap(tmp, self._journal_offset)
+
+    def _swap(self, tmp, covered):
+        # caller holds both locks and has replayed the whole journal; `tmp`
+        # is a snapshot of it up to offset `covered`
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(covered)
+                tail = f.read()
+        except FileNotFoundError:
+            tail = b""
+        journal = _write_temp(self.journal_path, lambda f: f.write(tail))
+        # the new snapshot holds every line up to `covered`, so a crash
+        # between the renames only means replaying those again
+        os.replace(tmp, self.path)
+        os.replace(journal, self.journal_path)
+        self._snapshot_sig = file_signature(self.path)
+        self._snapshot_bytes = self._snapshot_sig[2]
+        self._journal_ino = os.stat(self.journal_path).st_ino
+        self._journal_offset -= covered
+        self._journal_entries = tail[:self._journal_offset].count(b"\n")
@@ -0,0 +1,422 @@
+import os
+import sys
+import json
+import mmap
+import bisect
+import struct
+import zlib
+import logging
+import tempfile
+import threading
+from array import array
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+DIFFICULTIES = ("easy", "medium", "hard", "expert")
+
+# option permutations are planned over this many slots per question
+MAX_OPTIONS = 8
+
+PACK_MAGIC = b"TVQP"
+PACK_VERSION = 1
+PACK_SUFFIX = ".pack"
+# magic, version, question count, index id count, directory length
+_HEADER = struct.Struct("<4sIIII")
+
+
+class Question:
+    """One immutable question. Shared by every session, so it can't be modified."""
+
+    __slots__ = ("gid", "qid", "theme", "pos", "text", "options", "answer",
+                 "difficulty", "category", "tags", "explanation", "source")
+
+    def __init__(self, gid, qid, theme, text, options, answer, difficulty,
+                 category="", tags=(), explanation="", source="", pos=0):
+        for name, value in (
+            ("gid", gid), ("qid", qid), ("theme", theme), ("pos", pos), ("text", text),
+            ("options", tuple(options)), ("answer", answer), ("difficulty", difficulty),
+            ("category", category), ("tags", tuple(tags)),
+            ("explanation", explanation), ("source", source),
+        ):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Question is immutable")
+
+    def __repr__(self):
+        return f"Question({self.gid}, {self.qid!r})"
+
+    @property
+    def key(self):
+        """"<theme>#<position in its file>": unique and stable across restarts,
+        unlike `qid` (theme files reuse ids) or `gid` (shifts as themes are added)."""
+        return question_key(self.theme, self.pos)
+
+
+def question_key(theme, pos):
+    return f"{theme}#{pos}"
+
+
+def normalize_difficulty(record):
+    d = record.get("difficulty", "easy").strip().lower()
+    return d if d in DIFFICULTIES else "easy"
+
+
+# ----------------- Pack format -----------------
+# header | u32 record offsets[count] | u32 index ids[n] | directory JSON | records
+#
+# The directory maps "difficulty"/"category"/"tag" -> {key: [start, length]}
+# into the index ids, which are question positions within the pack. Records
+# are length-prefixed UTF-8 fields, decoded only when a question is shown.
+
+def _put_str(out, s):
+    b = s.encode("utf-8")
+    out += struct.pack("<I", len(b))
+    out += b
+
+
+def compile_pack(theme, records):
+    """Serialize one theme's question list (the .txt JSON format) to pack bytes."""
+    blob = bytearray()
+    offsets = array("I")
+    index = {"difficulty": {d: [] for d in DIFFICULTIES}, "category": {}, "tag": {}}
+    seen, dupes = set(), []
+    for i, r in enumerate(records):
+        qid = r.get("id")
+        if qid in seen:
+            dupes.append(qid)
+        seen.add(qid)
+        offsets.append(len(blob))
+        d = normalize_difficulty(r)
+        blob += struct.pack("<B", DIFFICULTIES.index(d))
+        for field in ("id", "question", "answer", "category", "explanation", "source"):
+            _put_str(blob, str(r.get(field, "")))
+        for seq in (r["options"], r.get("tags", [])):
+            blob += struct.pack("<B", len(seq))
+            for item in seq:
+                _put_str(blob, str(item))
+        index["difficulty"][d].append(i)
+        index["category"].setdefault(r.get("category", ""), []).append(i)
+        for tag in r.get("tags", []):
+            index["tag"].setdefault(tag, []).append(i)
+
+    if dupes:
+        log.warning("%s: %d duplicate question ids (%s); answer stats are kept per position instead",
+                    theme, len(dupes), ", ".join(sorted(set(map(str, dupes)))[:5]))
+    ids = array("I")
+    directory = {}
+    for section, mapping in index.items():
+        directory[section] = {}
+        for key, positions in mapping.items():
+            directory[section][key] = [len(ids), len(positions)]
+            ids.extend(positions)
+    meta = json.dumps({"theme": theme, "directory": directory}, ensure_ascii=False).encode("utf-8")
+    if sys.byteorder != "little":
+        offsets.byteswap()
+        ids.byteswap()
+    return b"".join([
+        _HEADER.pack(PACK_MAGIC, PACK_VERSION, len(offsets), len(ids), len(meta)),
+        offsets.tobytes(), ids.tobytes(), meta, bytes(blob),
+    ])
+
+
+def read_pack_count(path):
+    """Question count from a pack header, without mapping the file."""
+    with open(path, "rb") as f:
+        magic, version, count, _, _ = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != PACK_MAGIC or version != PACK_VERSION:
+        raise ValueError(f"{path}: not a v{PACK_VERSION} question pack")
+    return count
+
+
+def build_pack(theme, src, dst):
+    """Compile `src` into `dst` if the pack is missing or older than the source."""
+    try:
+        if os.path.getmtime(dst) >= os.path.getmtime(src):
+            read_pack_count(dst)
+            return False
+    except (OSError, ValueError):
+        pass
+    with open(src, "r", encoding="utf-8") as f:
+        data = compile_pack(theme, json.load(f))
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst) or ".", suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, dst)
+    return True
+
+
+class QuestionPack:
+    """Read-only view over pack bytes (usually an mmap)."""
+
+    def __init__(self, buf, theme=None):
+        self._buf = buf
+        magic, version, count, n_ids, meta_len = _HEADER.unpack_from(buf, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(f"not a v{PACK_VERSION} question pack")
+        view = memoryview(buf)
+        pos = _HEADER.size
+        self.count = count
+        self.offsets = view[pos:pos + 4 * count].cast("I")
+        pos += 4 * count
+        self.ids = view[pos:pos + 4 * n_ids].cast("I")
+        pos += 4 * n_ids
+        meta = json.loads(bytes(view[pos:pos + meta_len]).decode("utf-8"))
+        self.records_at = pos + meta_len
+        self.theme = theme or meta["theme"]
+        self.directory = meta["directory"]
+
+    def positions(self, section, key):
+        start, length = self.directory[section].get(key, (0, 0))
+        return self.ids[start:start + length]
+
+    def _str(self, pos):
+        (n,) = struct.unpack_from("<I", self._buf, pos)
+        pos += 4
+        return bytes(self._buf[pos:pos + n]).decode("utf-8"), pos + n
+
+    def question(self, i, gid):
+        pos = self.records_at + self.offsets[i]
+        d = self._buf[pos]
+        pos += 1
+        fields = []
+        for _ in range(6):
+            s, pos = self._str(pos)
+            fields.append(s)
+        seqs = []
+        for _ in range(2):
+            n = self._buf[pos]
+            pos += 1
+            items = []
+            for _ in range(n):
+                s, pos = self._str(pos)
+                items.append(s)
+            seqs.append(items)
+        qid, text, answer, category, explanation, source = fields
+        return Question(gid, qid, self.theme, text, seqs[0], answer, DIFFICULTIES[d],
+                        category, seqs[1], explanation, source, pos=i)
+
+
+class QuestionBank:
+    """Every theme's questions addressed by one global id (gid) space.
+
+    Each theme owns the gid range [base, base + count). Themes are opened
+    on first use: the pack is mapped, and questions are decoded and cached
+    as they are asked for. A run is an `array` of gids ('H' while the bank
+    fits in 16 bits), so a session holds two bytes per question.
+    """
+
+    def __init__(self):
+        self.by_theme = {}   # theme -> range of gids
+        self._bases = []
+        self._slots = []     # [theme, base, opener, pack, decoded]
+        self._slot_of = {}   # theme -> index into _slots
+        self._lock = threading.Lock()
+        self._size = 0
+        self._buckets = {}   # theme (None = all) -> {difficulty: array of gids}
+        self._versions = {}  # theme -> version()
+
+    def add_theme(self, theme, count, opener):
+        """Register `count` questions for `theme`; `opener()` returns pack bytes."""
+        self.by_theme[theme] = range(self._size, self._size + count)
+        self._bases.append(self._size)
+        self._slot_of[theme] = len(self._slots)
+        self._slots.append([theme, self._size, opener, None, None])
+        self._size += count
+
+    @classmethod
+    def from_files(cls, theme_files):
+        """Parse the JSON theme files now, keeping packs in memory."""
+        bank = cls()
+        for theme, path in theme_files.items():
+            with open(path, "r", encoding="utf-8") as f:
+                data = compile_pack(theme, json.load(f))
+            bank.add_theme(theme, QuestionPack(data).count, lambda data=data: data)
+        return bank
+
+    @classmethod
+    def from_packs(cls, theme_files, pack_dir):
+        """Build stale packs, then register themes from their headers only."""
+        bank = cls()
+        for theme, src in theme_files.items():
+            dst = os.path.join(pack_dir, os.path.splitext(os.path.basename(src))[0] + PACK_SUFFIX)
+            try:
+                build_pack(theme, src, dst)
+            except OSError:
+                # read-only checkout: compile into memory instead
+                with open(src, "r", encoding="utf-8") as f:
+                    data = compile_pack(theme, json.load(f))
+                bank.add_theme(theme, QuestionPack(data).count, lambda data=data: data)
+                continue
+            bank.add_theme(theme, read_pack_count(dst), lambda dst=dst: _map_file(dst))
+        return bank
+
+    def _slot(self, i):
+        slot = self._slots[i]
+        if slot[3] is None:
+            with self._lock:
+                if slot[3] is None:
+                    pack = QuestionPack(slot[2](), theme=slot[0])
+                    slot[4] = [None] * pack.count
+                    slot[3] = pack
+        return slot
+
+    def _theme_slot(self, theme):
+        i = self._slot_of.get(theme)
+        return None if i is None else self._slot(i)
+
+    def __getitem__(self, gid):
+        if not 0 <= gid < self._size:
+            raise IndexError(gid)
+        _theme, base, _opener, pack, decoded = self._slot(bisect.bisect_right(self._bases, gid) - 1)
+        q = decoded[gid - base]
+        if q is None:
+            q = decoded[gid - base] = pack.question(gid - base, gid)
+        return q
+
+    def __len__(self):
+        return self._size
+
+    def themes(self):
+        return list(self.by_theme)
+
+    def is_loaded(self, theme):
+        return self._slots[self._slot_of[theme]][3] is not None
+
+    def _ids(self, theme, section, key):
+        slot = self._theme_slot(theme)
+        if slot is None:
+            return []
+        base = slot[1]
+        return [base + i for i in slot[3].positions(section, key)]
+
+    def difficulty_ids(self, theme, difficulty):
+        return self._ids(theme, "difficulty", difficulty)
+
+    def category_ids(self, theme, category):
+        return self._ids(theme, "category", category)
+
+    def tag_ids(self, theme, tag):
+        return self._ids(theme, "tag", tag)
+
+    def difficulty_buckets(self, theme=None):
+        """{difficulty: array of gids} for `theme` (None = every theme), built once."""
+        buckets = self._buckets.get(theme)
+        if buckets is None:
+            themes = [theme] if theme is not None else self.themes()
+            buckets = {
+                d: array("I", [g for t in themes for g in self.difficulty_ids(t, d)])
+                for d in DIFFICULTIES
+            }
+            self._buckets[theme] = buckets
+        return buckets
+
+    def version(self, theme):
+        """Checksum of `theme`'s gid range and pack, as 8 hex digits.
+
+        A seeded run of `theme` (engine.seeded_run) is the same questions
+        wherever the version is the same, so a run can be rebuilt from its
+        seed by another worker, or after a restart, and refused once the
+        theme file has changed.
+        """
+        version = self._versions.get(theme)
+        if version is None:
+            slot = self._theme_slot(theme)
+            if slot is None:
+                return None
+            base, pack = slot[1], slot[3]
+            crc = zlib.crc32(struct.pack("<II", base, pack.count))
+            version = self._versions[theme] = f"{zlib.crc32(pack._buf, crc):08x}"
+        return version
+
+    def preload(self):
+        """Map every pack, decode every question and build every bucket now."""
+        for i, slot in enumerate(self._slots):
+            _theme, base, _opener, pack, decoded = self._slot(i)
+            for j in range(pack.count):
+                if decoded[j] is None:
+                    decoded[j] = pack.question(j, base + j)
+        for theme in [None, *self.themes()]:
+            self.difficulty_buckets(theme)
+
+    def theme_questions(self, theme):
+        return [self[g] for g in self.by_theme.get(theme, ())]
+
+    @property
+    def typecode(self):
+        return "H" if self._size <= 0xFFFF else "I"
+
+    def make_run(self, gids):
+        """Pack a sequence of gids into a compact run."""
+        return array(self.typecode, gids)
+
+
+class Run:
+    """A run's gids plus the option layout planned for it at start.
+
+    Both tables are drawn for the whole run in one NumPy pass:
+
+    - `perms`: one permutation of range(MAX_OPTIONS) per question, as uint8
+      rows. A question with n options shows the entries < n in row order,
+      which is a uniform permutation of its options.
+    - `picks`: one uint16 per question choosing which wrong option survives
+      50:50 (its rank among the wrong options, scaled by 1/65536).
+
+    Re-rendering a question therefore shows the same order, and 50:50 keeps
+    the two survivors in that order.
+    """
+
+    __slots__ = ("gids", "perms", "picks")
+
+    def __init__(self, gids, perms, picks):
+        self.gids = gids
+        self.perms = perms
+        self.picks = picks
+
+    @classmethod
+    def plan(cls, gids, seed=None):
+        rng = np.random.default_rng(seed)
+        keys = rng.random((len(gids), MAX_OPTIONS))
+        perms = np.argsort(keys, axis=1).astype(np.uint8).tobytes()
+        picks = array("H")
+        picks.frombytes(rng.integers(0, 1 << 16, len(gids), dtype=np.uint16).tobytes())
+        return cls(gids, perms, picks)
+
+    def __len__(self):
+        return len(self.gids)
+
+    def __getitem__(self, i):
+        return self.gids[i]
+
+    def order(self, i, n):
+        row = self.perms[i * MAX_OPTIONS:(i + 1) * MAX_OPTIONS]
+        return [k for k in row if k < n] + list(range(MAX_OPTIONS, n))
+
+    def options(self, i, q):
+        """q's options in this run's display order."""
+        return [q.options[k] for k in self.order(i, len(q.options))]
+
+    def fifty(self, i, q):
+        """The two options left after 50:50, in display order."""
+        shown = self.options(i, q)
+        wrong = [o for o in shown if o != q.answer]
+        keep = wrong[self.picks[i] * len(wrong) >> 16]
+        return [o for o in shown if o == q.answer or o == keep]
+
+
+def _map_file(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+if __name__ == "__main__":
+    # python questions.py <pack_dir> FRIENDS.txt Naruto.txt ...
+    if len(sys.argv) < 3:
+        sys.exit("usage: python questions.py <pack_dir> <theme.txt>...")
+    for src in sys.argv[2:]:
+        stem = os.path.splitext(os.path.basename(src))[0]
+        dst = os.path.join(sys.argv[1], stem + PACK_SUFFIX)
+        print(("built " if build_pack(stem, src, dst) else "fresh ") + dst)
@@ -0,0 +1,117 @@
+import os
+import time
+import fcntl
+
+from persist import JournaledStore
+from metrics import record_io
+
+
+class ResumeStore(JournaledStore):
+    """Games in progress by resume token, so a refreshed page can pick its game up.
+
+    Each record is a small dict of GameSession fields (engine.RUN_FIELDS)
+    keyed by an opaque token the browser keeps in localStorage. Like
+    VoucherLedger it is a snapshot (`games.json`, {token: record}) plus an
+    append-only journal (persist.JournaledStore): `save` appends one line
+    holding only the fields that changed, and `end` one line dropping the
+    record. A lookup (once per page load) first replays whatever other
+    workers appended since the last one, then is a dict hit.
+
+    The journal is folded into a fresh snapshot in the background once it
+    has grown past the last snapshot (and `min_compact_bytes`), so it is
+    never rewritten per answer and at most doubles what is on disk. Records
+    untouched for `ttl` seconds are left out then. The snapshot is written
+    with no lock held, so games carry on saving meanwhile.
+
+    Appends hold a shared flock on `<snapshot>.lock` and the compaction's
+    final swap an exclusive one (persist.file_lock), so several worker
+    processes can append at once and no line is lost to a compaction.
+    """
+
+    SNAPSHOT_FORMAT = {"separators": (",", ":")}
+
+    def __init__(self, path, journal_path=None, ttl=86400.0, min_compact_bytes=1 << 20):
+        super().__init__(path, journal_path)
+        self.ttl = ttl
+        self.min_compact_bytes = min_compact_bytes
+        self._fd = None            # journal, O_APPEND
+        self._lock_fd = None       # <snapshot>.lock, kept open for the shared flock
+
+    def _apply(self, entry):
+        token = entry.pop("t", None)
+        if entry.pop("op", None) == "end":
+            self.data.pop(token, None)
+        elif token:
+            self.data.setdefault(token, {}).update(entry)
+
+    def _live(self):
+        cutoff = time.time() - self.ttl
+        return {t: g for t, g in self.data.items() if g.get("ts", 0) >= cutoff}
+
+    def _snapshot_data(self):
+        return {t: dict(g) for t, g in self._live().items()}
+
+    def _pruned(self):
+        self.data = self._live()
+
+    # ---- reads ----
+
+    def get(self, token):
+        """A copy of the record saved under `token`, or None."""
+        if not token:
+            return None
+        with self._lock:
+            # the game may have moved on in another worker since we saw it
+            self._sync()
+            game = self.data.get(token)
+            if game is None or time.time() - game.get("ts", 0) > self.ttl:
+                return None
+            return dict(game)
+
+    def __len__(self):
+        with self._lock:
+            return len(self.data)
+
+    # ---- writes ----
+
+    def save(self, token, fields):
+        """Record `fields` for `token`; only the ones that changed are written."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            game = self.data.setdefault(token, {})
+            delta = {k: v for k, v in fields.items() if k not in game or game[k] != v}
+            if not delta:
+                return
+            delta["ts"] = round(time.time(), 1)
+            game.update(delta)
+            self._append({"t": token, **delta})
+
+    def end(self, token):
+        """The game under `token` is over: forget it."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if self.data.pop(token, None) is not None:
+                self._append({"t": token, "op": "end"})
+
+    def _append(self, entry):
+        # caller holds self._lock; our own lines are applied already, and
+        # replaying them later (after another worker's) changes nothing
+        line = self._encode(entry)
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        # shared: other appenders may write too, a compaction's swap may not
+        fcntl.flock(self._lock_fd, fcntl.LOCK_SH)
+        try:
+            if self._fd is None or self._journal_moved(self._fd):
+                if self._fd is not None:
+                    os.close(self._fd)
+                self._fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self._fd, line)
+            journal_bytes = os.lseek(self._fd, 0, os.SEEK_CUR)
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        record_io("write", self.journal_path, len(line))
+        if journal_bytes >= max(self.min_compact_bytes, self._snapshot_bytes):
+            self._compact_in_background("resume-compact")
@@ -0,0 +1,132 @@
+import logging
+import threading
+from collections import deque, OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+class RunPool:
+    """Ready-made runs per (theme, mode), refilled by a background thread.
+
+    `take` pops a finished run in O(1). Each run object is handed out
+    exactly once (deque.popleft under the lock), so two sessions never share
+    one. On a miss the caller builds its own run and the key is queued for
+    refill; keys are only filled after their first request, so themes nobody
+    plays are never loaded.
+    """
+
+    def __init__(self, make_run, depth=8):
+        self.make_run = make_run
+        self.depth = depth
+        self.hits = 0
+        self.misses = 0
+        self._pools = {}          # (theme, mode) -> deque of runs
+        self._lock = threading.Lock()
+        self._wanted = threading.Condition(self._lock)
+        self._thread = None
+
+    def take(self, theme, mode):
+        key = (theme, mode)
+        with self._lock:
+            pool = self._pools.setdefault(key, deque())
+            run = pool.popleft() if pool else None
+            if run is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._produce, name="run-pool", daemon=True)
+                self._thread.start()
+            self._wanted.notify()
+        return run if run is not None else self.make_run(theme, mode)
+
+    def _next_short(self):
+        for key, pool in self._pools.items():
+            if len(pool) < self.depth:
+                return key
+        return None
+
+    def _produce(self):
+        while True:
+            with self._lock:
+                key = self._next_short()
+                while key is None:
+                    self._wanted.wait()
+                    key = self._next_short()
+            try:
+                run = self.make_run(*key)
+            except Exception:  # a bad key must not kill the producer
+                log.exception("run pool: cannot build %s", key)
+                with self._lock:
+                    self._pools.pop(key, None)
+                continue
+            with self._lock:
+                self._pools[key].append(run)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "ready": {f"{t}|{m}": len(p) for (t, m), p in self._pools.items()},
+            }
+
+    def gauges(self):
+        with self._lock:
+            return {
+                "run_pool_hits": (self.hits, "Runs handed out ready-made since start."),
+                "run_pool_misses": (self.misses, "Runs built by the caller because the pool was empty."),
+                "run_pool_ready": (sum(map(len, self._pools.values())), "Ready-made runs waiting in the pool."),
+            }
+
+
+class RunCache:
+    """Planned runs of games in progress by (theme, mode, seed), least recently used out.
+
+    Sessions keep only the key; `get` returns the run, building it with
+    `build(theme, mode, seed)` when this process has not got it (the game
+    started on another worker, or was pushed out). A seeded build is the
+    same run every time, so a miss costs time, never a different game.
+    """
+
+    def __init__(self, build, size=1024):
+        self.build = build
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # a hit takes no lock: get and move_to_end are single C calls
+        run = self._runs.get(key)
+        if run is not None:
+            try:
+                self._runs.move_to_end(key)
+            except KeyError:  # pushed out just now; this caller still has it
+                pass
+            self.hits += 1
+            return run
+        self.misses += 1
+        # two sessions missing the same key build it twice
+        run = self.build(*key)
+        self.put(key, run)
+        return run
+
+    def put(self, key, run):
+        with self._lock:
+            self._runs[key] = run
+            self._runs.move_to_end(key)
+            while len(self._runs) > self.size:
+                self._runs.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "cached": len(self._runs)}
+
+    def gauges(self):
+        return {
+            "run_cache_hits": (self.hits, "Runs of games in progress found in this process."),
+            "run_cache_misses": (self.misses, "Runs of games in progress rebuilt from their seed."),
+            "run_cache_size": (len(self._runs), "Runs of games in progress held in this process."),
+        }
@@ -0,0 +1,97 @@
+import os
+import hmac
+import base64
+import hashlib
+import secrets
+import tempfile
+import threading
+
+SEP = "\x1f"
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class RunTokens:
+    """A run's (theme, mode, seed, bank_version) as a string the browser can hold.
+
+    `<payload>.<tag>`, both base64url: the tag is the first 16 bytes of an
+    HMAC-SHA256 of the payload, so a token only verifies if this server (or
+    one sharing its key) issued it, unchanged.
+    """
+
+    def __init__(self, key=None, path=None):
+        self._key = key
+        self.path = path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        """Keyed by `path`, read (or made) on the first sign or verify.
+
+        Like the other stores under persistent_dir, nothing is touched
+        before a token is needed.
+        """
+        return cls(path=path)
+
+    @property
+    def key(self):
+        if self._key is None:
+            with self._lock:
+                if self._key is None:
+                    self._key = _read_or_create_key(self.path)
+        return self._key
+
+    def _tag(self, payload):
+        return hmac.new(self.key, payload, hashlib.sha256).digest()[:16]
+
+    def sign(self, theme, mode, seed, version):
+        payload = SEP.join((theme, mode, str(seed), version)).encode("utf-8")
+        return f"{_b64(payload)}.{_b64(self._tag(payload))}"
+
+    def verify(self, token):
+        """(theme, mode, seed, version) from a token we issued, else None."""
+        if not isinstance(token, str) or token.count(".") != 1 or len(token) > 512:
+            return None
+        try:
+            payload, tag = (_unb64(part) for part in token.split("."))
+            if not hmac.compare_digest(tag, self._tag(payload)):
+                return None
+            theme, mode, seed, version = payload.decode("utf-8").split(SEP)
+            return theme, mode, int(seed), version
+        except ValueError:  # bad base64, bad UTF-8, wrong field count
+            return None
+
+
+def _read_or_create_key(path):
+    """The key in `path`, made with a fresh random key the first time.
+
+    Every worker sharing the directory ends up with the same key: the first
+    one to link its key file into place wins, the rest read it.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix="." + os.path.basename(path) + "-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.unlink(tmp)
+    with open(path, "rb") as f:
+        return f.read()
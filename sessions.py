@@ -0,0 +1,220 @@
+"""Player sessions: idle expiry, a cap on how many are live, and what they hold.
+
+Gradio 5.29 keeps two kinds of per-player memory it never fully lets go of:
+
+- its StateHolder, keyed by session hash: the gr.State values (here one
+  engine.GameSession and its planned run) and a copy of each component an
+  event sent a prop update to. A session leaves only when `capacity` newer
+  ones push it out (10000 by default), and its time_last_used entry never
+  does;
+- its queue's bookkeeping, per event: the Event with the whole request it
+  came in on, its analytics row and its finished asyncio task, plus one id
+  set per session hash. None of it is ever removed, so a game of ~35 events
+  leaves ~370 KB behind whether or not its session is still around.
+
+A PWA closed mid-run is never coming back for any of it. SessionReaper
+drops whole sessions from the holder:
+
+- after `idle_seconds` without an event,
+- past `max_sessions`, least recently used first. That is the holder's own
+  LRU with its capacity set to `max_sessions`; the sweep forgets what it
+  pushed out.
+
+and forgets the queue's finished events and the id sets of dropped
+sessions. It reads Gradio internals (state_holder, _queue) to do so,
+which is one reason requirements.txt pins Gradio. `attach` checks that
+the attributes it uses are there and leaves alone whatever part is
+missing, with a warning, instead of failing mid-sweep after an upgrade;
+benchmarks/check_gradio_internals.py fails outright.
+
+Closing the tab is not a reason of its own. Blocks.unload fires whenever
+the heartbeat drops, and a PWA that was backgrounded or briefly offline
+reconnects under the same session hash; dropping it then would greet its
+next click with an expired game. Past `idle_seconds` the page reloads
+itself on the next click that finds no server event in that long
+(Theme.IDLE_RELOAD_JS) and resumes from its resume token. An event from
+a session dropped anyway (over the cap, say) is attached to that token
+first (Theme.attached), so the player, voucher and game come back.
+"""
+import sys
+import time
+import asyncio
+import logging
+import datetime
+import threading
+import contextlib
+
+import gradio
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+# the release these internals were read from (requirements.txt pins it)
+GRADIO_VERSION = "5.29.0"
+HOLDER_ATTRS = ("lock", "capacity", "session_data", "time_last_used")
+QUEUE_ATTRS = ("event_ids_to_events", "event_analytics", "pending_event_ids_session",
+               "active_jobs", "_asyncio_tasks")
+
+
+def missing_internals(demo):
+    """(holder attributes, queue attributes) SessionReaper needs but `demo` lacks."""
+    holder = getattr(demo, "state_holder", None)
+    queue = getattr(demo, "_queue", None)
+    return ([a for a in HOLDER_ATTRS if not hasattr(holder, a)],
+            [a for a in QUEUE_ATTRS if not hasattr(queue, a)])
+
+
+class SessionReaper:
+    """Eviction of idle sessions, and of finished queue events, with accounting.
+
+    `sizeof(value)` estimates the bytes one gr.State value holds. Once the
+    app is running (`lifespan`), a sweep runs every `interval` seconds and
+    exports `live`, `bytes_held` and the eviction counts
+    (quiz_live_sessions, quiz_session_bytes, quiz_sessions_evicted_<reason>).
+    """
+
+    def __init__(self, idle_seconds=900.0, max_sessions=5000, interval=30.0, sizeof=sys.getsizeof):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.interval = interval
+        self.sizeof = sizeof
+        self.holder = None
+        self.queue = None
+        self._defaults = {}      # block id -> the app's own component, shared by every session
+        self._finished = set()   # event ids found finished by the previous sweep
+        self._lock = threading.Lock()
+        self.live = 0
+        self.bytes_held = 0
+        self.events_dropped = 0
+        self.evicted = {"idle": 0, "lru": 0}
+
+    def attach(self, demo):
+        """Manage `demo`'s sessions. Call once it is mounted (it has a state holder then)."""
+        if gradio.__version__ != GRADIO_VERSION:
+            log.warning("session reaper was written against Gradio %s, running %s",
+                        GRADIO_VERSION, gradio.__version__)
+        holder_missing, queue_missing = missing_internals(demo)
+        if holder_missing:
+            log.warning("Gradio state holder lacks %s; sessions are not reaped", ", ".join(holder_missing))
+            return
+        self.holder = demo.state_holder
+        self.holder.capacity = self.max_sessions
+        if queue_missing:
+            log.warning("Gradio queue lacks %s; finished events are not pruned", ", ".join(queue_missing))
+        else:
+            self.queue = demo._queue
+        self._defaults = dict(demo.blocks)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(self, app):
+        """FastAPI lifespan: sweep in the background while the app runs."""
+        task = asyncio.create_task(self._run())
+        try:
+            yield
+        finally:
+            task.cancel()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+                # the queue changes its bookkeeping on the event loop; so do we
+                self.prune_queue()
+            except Exception:  # keep sweeping; one bad pass must not stop it
+                log.exception("session sweep failed")
+
+    def _drop(self, session_hash, reason, idle_before):
+        holder = self.holder
+        with holder.lock:
+            # it may have had an event since the sweep looked
+            last = holder.time_last_used.get(session_hash)
+            if last is None or last >= idle_before:
+                return False
+            gone = holder.session_data.pop(session_hash, None)
+            holder.time_last_used.pop(session_hash, None)
+        if gone is None:
+            return False
+        with self._lock:
+            self.evicted[reason] += 1
+        return True
+
+    def sweep(self):
+        """Drop sessions idle for `idle_seconds`, forget the ones the cap pushed
+        out, then recount what is live. Returns how many were dropped."""
+        holder = self.holder
+        if holder is None:
+            return 0
+        # Gradio stamps time_last_used with datetime.now() on every event
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=self.idle_seconds)
+        last_used = holder.time_last_used.copy()
+        idle = sum(self._drop(sid, "idle", cutoff) for sid, last in last_used.items() if last < cutoff)
+
+        lru = 0
+        with holder.lock:
+            for sid in last_used:
+                if sid not in holder.session_data and holder.time_last_used.pop(sid, None) is not None:
+                    lru += 1
+        with self._lock:
+            self.evicted["lru"] += lru
+
+        t0 = time.perf_counter()
+        sessions = list(holder.session_data.copy().values())
+        self.live = len(sessions)
+        self.bytes_held = sum(self._session_bytes(state) for state in sessions)
+        self._export()
+        if idle or lru:
+            log.info("dropped %d idle, %d over the cap; %d live, ~%.1f MB (counted in %.0f ms)",
+                     idle, lru, self.live, self.bytes_held / 1e6, (time.perf_counter() - t0) * 1e3)
+        return idle + lru
+
+    def prune_queue(self):
+        """Forget finished events and the id sets of dropped sessions.
+
+        Must run on the server's event loop. An event is finished once it is
+        neither pending (waiting, running or undelivered) nor running; it is
+        dropped by the sweep after the one that first sees it finished,
+        because process_events still writes its analytics row for a moment
+        after the result went out. Returns how many events were dropped.
+        """
+        queue = self.queue
+        if queue is None:
+            return 0
+        ids = list(queue.event_ids_to_events)
+        pending = set().union(*queue.pending_event_ids_session.values())
+        running = {e._id for job in queue.active_jobs if job for e in job}
+        stale, self._finished = self._finished, {i for i in ids if i not in pending and i not in running}
+        for event_id in stale:
+            queue.event_ids_to_events.pop(event_id, None)
+            queue.event_analytics.pop(event_id, None)
+        self._finished -= stale
+        queue._asyncio_tasks = [t for t in queue._asyncio_tasks if not t.done()]
+        for sid, pending_ids in list(queue.pending_event_ids_session.items()):
+            if not pending_ids and sid not in self.holder.session_data:
+                del queue.pending_event_ids_session[sid]
+        self.events_dropped += len(stale)
+        metrics.registry.set_gauge("queue_events", len(queue.event_ids_to_events),
+                                   "Events the queue still keeps (pending or finished since the last sweep).")
+        return len(stale)
+
+    def _session_bytes(self, state):
+        config = state.blocks_config
+        blocks = list(config.blocks.items())
+        n = sys.getsizeof(state) + sys.getsizeof(config.blocks) + sys.getsizeof(config.fns)
+        for block_id, block in blocks:
+            if block is not self._defaults.get(block_id):
+                # this session's own copy, made by a prop update
+                n += sys.getsizeof(block) + sys.getsizeof(vars(block))
+        for value in list(state.state_data.values()):
+            n += self.sizeof(value)
+        return n
+
+    def _export(self):
+        registry = metrics.registry
+        registry.set_gauge("live_sessions", self.live, "Browser sessions held in memory.")
+        registry.set_gauge("session_bytes", self.bytes_held, "Estimated bytes held by live sessions.")
+        with self._lock:
+            evicted = dict(self.evicted)
+        for reason, n in evicted.items():
+            registry.set_gauge(f"sessions_evicted_{reason}", n, f"Sessions dropped ({reason}) since start.")
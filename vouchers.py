@@ -0,0 +1,113 @@
+import os
+import time
+
+from persist import JournaledStore, file_lock
+from metrics import record_io
+
+
+class VoucherLedger(JournaledStore):
+    """Voucher store: an immutable snapshot plus an append-only journal.
+
+    The snapshot is the plain `vouchers.json` format ({code: {"type",
+    "redeemed", "consumed"}}), so existing files load as-is. Consuming a code
+    appends one line to `<snapshot>.journal` instead of rewriting the
+    snapshot; once it holds `compact_every` entries a background thread
+    folds it into a fresh snapshot (persist.JournaledStore.compact), so no
+    redemption waits on a snapshot rewrite.
+
+    Reads are served from memory. The files are re-stat'ed at most every
+    `recheck_interval` seconds so codes added by hand, or consumed by
+    another process, are picked up without a parse per click.
+
+    Writes hold an flock on `<snapshot>.lock` and replay the journal before
+    checking, so with several worker processes a code is consumed exactly
+    once: the check and the append are one step across all of them.
+    """
+
+    SNAPSHOT_FORMAT = {"indent": 2}
+
+    def __init__(self, path, journal_path=None, recheck_interval=2.0, compact_every=500):
+        super().__init__(path, journal_path)
+        self.recheck_interval = recheck_interval
+        self.compact_every = compact_every
+        self._checked_at = None
+
+    def _apply(self, entry):
+        v = self.data.get(entry.get("code"))
+        if v is not None and entry.get("op") == "consume":
+            v["consumed"] = True
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.recheck_interval:
+            return
+        with self._lock:
+            self._sync()
+            self._checked_at = time.monotonic()
+
+    # ---- reads ----
+
+    def lookup(self, code):
+        """The voucher record for `code` (consumed or not), or None."""
+        if not code:
+            return None
+        self._refresh()
+        v = self.data.get(code)
+        return dict(v) if v is not None else None
+
+    def voucher_type(self, code):
+        """Type of an unconsumed voucher, or None."""
+        if not code:
+            return None
+        self._refresh()
+        v = self.data.get(code)
+        if v is None or v.get("consumed", False):
+            return None
+        return v.get("type")
+
+    def is_available(self, code, kind):
+        """Is `code` a valid, unconsumed voucher of type `kind`?"""
+        return bool(code) and self.voucher_type(code) == kind
+
+    def snapshot(self):
+        self._refresh()
+        with self._lock:
+            return {code: dict(v) for code, v in self.data.items()}
+
+    def __len__(self):
+        self._refresh()
+        return len(self.data)
+
+    # ---- writes ----
+
+    def consume(self, code):
+        """Mark `code` consumed. Returns False if it is unknown or already used."""
+        if not code:
+            return False
+        with self._lock, file_lock(self.path):
+            self._refresh(force=True)
+            v = self.data.get(code)
+            if v is None or v.get("consumed", False):
+                return False
+            line = self._encode({"op": "consume", "code": code, "ts": time.time()})
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            record_io("write", self.journal_path, len(line))
+            v["consumed"] = True
+            # picks up our line plus anything another writer appended since
+            self._replay()
+            if self._journal_entries >= self.compact_every:
+                self._compact_in_background("voucher-compact")
+            return True
+
+    def add(self, vouchers):
+        """Import codes in vouchers.json format; existing codes are kept."""
+        with self._lock, file_lock(self.path):
+            self._refresh(force=True)
+            for code, v in vouchers.items():
+                self.data.setdefault(code, dict(v))
+            self._rewrite()
@@ -0,0 +1,179 @@
+"""Run several app processes behind a session-sticky proxy.
+
+    python workers.py --workers 4 [--port 8080]
+
+gr.State lives in the worker that served a session's first event, so every
+request of a session has to go back to that worker. Gradio names the
+session in its queue requests (session_hash in the join body, in the
+data-stream query string, in the heartbeat path); the proxy hashes it to
+pick a worker. Anything without one (page, config, assets) is routed by
+client address.
+
+The parent imports the app, opens the question bank and preloads it
+(every question decoded, every index built), then forks the workers; each
+runs Theme.create_app on 127.0.0.1, ports port+1 .. port+N. The bank and
+the imported modules are shared copy-on-write, so a worker is serving in
+well under a second instead of importing Gradio and building its own
+tables. Set PRELOAD=0 to let each worker load themes on first use.
+
+Workers share PERSISTENT_DIR: vouchers, the JSON leaderboard, feedback and
+analytics take an flock around their read-modify-write steps.
+LEADERBOARD_BACKEND defaults to sqlite here.
+"""
+import os
+import sys
+import json
+import atexit
+import time
+import zlib
+import signal
+import logging
+import argparse
+import urllib.request
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+import engine
+import Theme
+
+# not forwarded in either direction
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "proxy-connection", "te", "trailer"}
+
+
+def session_key(request, body):
+    """The Gradio session of a request, or the client address."""
+    key = request.query_params.get("session_hash")
+    if key:
+        return key
+    parts = request.url.path.rstrip("/").split("/")
+    if len(parts) >= 2 and parts[-2] == "heartbeat":
+        return parts[-1]
+    if body and request.method == "POST" and request.url.path.endswith("/queue/join"):
+        try:
+            key = json.loads(body).get("session_hash")
+        except (ValueError, AttributeError):
+            key = None
+        if key:
+            return key
+    return request.client.host if request.client else ""
+
+
+def make_proxy(upstreams):
+    client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=10.0), limits=httpx.Limits(max_connections=None))
+
+    async def proxy(request):
+        body = await request.body()
+        key = session_key(request, body)
+        upstream = upstreams[zlib.crc32(key.encode()) % len(upstreams)]
+        url = upstream + request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        # Host is kept so Gradio builds its URLs for the proxy, not the worker
+        headers = [(k, v) for k, v in request.headers.raw
+                   if k.decode("latin-1").lower() not in HOP_HEADERS | {"content-length"}]
+        upstream_req = client.build_request(request.method, url, headers=headers, content=body)
+        resp = await client.send(upstream_req, stream=True)
+        return StreamingResponse(
+            resp.aiter_raw(),
+            status_code=resp.status_code,
+            headers={k: v for k, v in resp.headers.items() if k.lower() not in HOP_HEADERS},
+            background=BackgroundTask(resp.aclose),
+        )
+
+    methods = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"]
+    return Starlette(routes=[Route("/{path:path}", proxy, methods=methods)], on_shutdown=[client.aclose])
+
+
+def start_workers(config, n, base_port):
+    """Fork `n` workers serving Theme.create_app; returns their pids and URLs."""
+    bank = engine.open_bank(config)
+    if config.preload:
+        engine.preload(bank)
+    pids = []
+    for i in range(n):
+        port = base_port + 1 + i
+        pid = os.fork()
+        if pid == 0:
+            run_worker(config, bank, port)  # never returns
+        pids.append(pid)
+    upstreams = [f"http://127.0.0.1:{base_port + 1 + i}" for i in range(n)]
+    for pid, url in zip(pids, upstreams):
+        while True:
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                stop_workers(pids)
+                sys.exit(f"worker {url} exited with {os.waitstatus_to_exitcode(status)}")
+            try:
+                urllib.request.urlopen(url + "/", timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.25)
+    return pids, upstreams
+
+
+def run_worker(config, bank, port):
+    started = time.monotonic()
+    # uvicorn re-raises SIGTERM once it has shut down; make that a normal exit
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    code = 1
+    try:
+        app = Theme.create_app(config, bank=bank, started=started)
+        uvicorn.run(app, host="127.0.0.1", port=port, access_log=False, timeout_graceful_shutdown=5)
+        code = 0
+    except SystemExit as e:
+        code = e.code or 0
+    finally:
+        # flush buffered scores and stats, then leave without unwinding
+        # into the parent's code
+        atexit._run_exitfuncs()
+        os._exit(code)
+
+
+def stop_workers(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)  # workers flush buffered scores on exit
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + 30
+    for pid in pids:
+        while True:
+            try:
+                done, _status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if done:
+                break
+            if time.monotonic() > deadline:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                break
+            time.sleep(0.1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("WORKERS", 2)))
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8080)))
+    args = ap.parse_args()
+
+    os.environ.setdefault("LEADERBOARD_BACKEND", "sqlite")
+    os.environ.setdefault("PRELOAD", "1")
+    config = engine.Config.from_env()
+    pids, upstreams = start_workers(config, args.workers, args.port)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        print(f"{args.workers} workers ready, proxy on {args.host}:{args.port}")
+        uvicorn.run(make_proxy(upstreams), host=args.host, port=args.port, log_level="warning")
+    finally:
+        stop_workers(pids)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per proxied request otherwise
+    main()